@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+AVAILABILITY_COLUMNS = ['availability_30', 'availability_60', 'availability_90', 'availability_365']
+PRICE_BINS = 50
+REVIEW_SCORE_BINS = 20
+
+
+def _codes(series):
+    """Category codes and labels of a column, -1 for missing"""
+    categorical = series.astype('category')
+    # Codes are int8 for few categories; widen them before they are combined into cell numbers
+    return categorical.cat.codes.to_numpy().astype(np.int64), categorical.cat.categories
+
+
+def _floats(series):
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def bin_index(values, bins):
+    """Equal-width bin of every value between the min and max, -1 for missing"""
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return np.full(len(values), -1), np.linspace(0, 1, bins + 1)
+    low, high = values[valid].min(), values[valid].max()
+    edges = np.linspace(low, high if high > low else low + 1, bins + 1)
+    index = np.full(len(values), -1)
+    index[valid] = np.clip(np.searchsorted(edges, values[valid], side='right') - 1, 0, bins - 1)
+    return index, edges
+
+
+def _counts(codes, size):
+    return np.bincount(codes[codes >= 0], minlength=size)
+
+
+def summarize(df, price_bins=PRICE_BINS, review_score_bins=REVIEW_SCORE_BINS):
+    """Everything the Advanced Analysis charts plot, from one set of column arrays.
+
+    Each column is turned into a NumPy array once and every summary is a
+    bincount over those arrays, instead of a separate value_counts, pivot or
+    groupby over the frame per chart.
+    """
+    property_codes, property_types = _codes(df['property_type'])
+    room_codes, room_types = _codes(df['room_type'])
+    cancellation_codes, cancellation_policies = _codes(df['cancellation_policy'])
+    price = _floats(df['price'])
+    review_scores = _floats(df['review_scores_rating'])
+
+    room_type_counts = (pd.DataFrame({'room_type': room_types, 'count': _counts(room_codes, len(room_types))})
+                        .query('count > 0').sort_values('count', ascending=False, kind='stable')
+                        .reset_index(drop=True))
+
+    # Property x room mean price
+    cells = len(property_types) * len(room_types)
+    priced = (property_codes >= 0) & (room_codes >= 0) & ~np.isnan(price)
+    cell = property_codes[priced] * len(room_types) + room_codes[priced]
+    with np.errstate(invalid='ignore'):
+        means = (np.bincount(cell, weights=price[priced], minlength=cells)
+                 / np.bincount(cell, minlength=cells)).reshape(len(property_types), len(room_types))
+    price_matrix = pd.DataFrame(means, index=pd.Index(property_types, name='property_type'),
+                                columns=pd.Index(room_types, name='room_type'))
+    price_matrix = price_matrix.dropna(how='all').dropna(axis=1, how='all')
+
+    # Price histogram per property type
+    price_bin, price_edges = bin_index(price, price_bins)
+    binned = (price_bin >= 0) & (property_codes >= 0)
+    counts = np.bincount(property_codes[binned] * price_bins + price_bin[binned],
+                         minlength=len(property_types) * price_bins).reshape(len(property_types), price_bins)
+    type_index, bin_positions = np.nonzero(counts)
+    price_histogram = pd.DataFrame({
+        'property_type': np.asarray(property_types)[type_index],
+        'price_start': price_edges[bin_positions],
+        'price_end': price_edges[bin_positions + 1],
+        'count': counts[type_index, bin_positions],
+    })
+
+    review_bin, review_edges = bin_index(review_scores, review_score_bins)
+    review_score_histogram = pd.DataFrame({
+        'review_scores_start': review_edges[:-1],
+        'review_scores_end': review_edges[1:],
+        'count': _counts(review_bin, review_score_bins),
+    })
+
+    cancellation_counts = (pd.DataFrame({'cancellation_policy': cancellation_policies,
+                                         'number_of_hotels': _counts(cancellation_codes, len(cancellation_policies))})
+                           .query('number_of_hotels > 0')
+                           .sort_values('number_of_hotels', ascending=False, kind='stable')
+                           .reset_index(drop=True))
+
+    availability = {}
+    for column in AVAILABILITY_COLUMNS:
+        values = _floats(df[column])
+        values = values[~np.isnan(values)].astype(np.int64)
+        offset = values.min() if len(values) else 0
+        counts = np.bincount(values - offset)
+        days = np.flatnonzero(counts)
+        availability[column] = pd.DataFrame({column: days + offset, 'number_of_hotels': counts[days]})
+
+    return {
+        'listing_count': len(df),
+        'room_type_counts': room_type_counts,
+        'price_matrix': price_matrix,
+        'price_histogram': price_histogram,
+        'review_score_histogram': review_score_histogram,
+        'cancellation_counts': cancellation_counts,
+        'availability': availability,
+    }
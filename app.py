@@ -1,56 +1,127 @@
+import contextlib
+import functools
+import math
+import os
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import pydeck as pdk
-from sqlalchemy import create_engine
 
-db_user = 'postgres'
-db_password = 'postgres'
-db_host = 'localhost'
-db_port = '5432'
-db_name = 'airbnb'
+from aggregations import summarize
+from data_access import DATABASE_URL, gather
+from data_access import get_engine as pooled_engine
+from downsampling import grid_aggregate, stratified_sample
+from facets import FacetService
+from figure_cache import FigureCache, normalize_filters
+from instrumentation import StepTimer, TimedProxy
+from listing_store import ListingStore
+from queries import ANALYSIS_COLUMNS, EXPLORATION_COLUMNS, MAP_COLUMNS, SqlListingSource
+from similar_listings import SimilarListings
+from spatial_index import viewport
+from summaries import read_rollup, summarize_rollup
+
+# 'memory' filters the cached table in process, 'sql' pushes the page filters down to Postgres,
+# 'snapshot' serves memory-mapped files written by snapshot.py without a database
+data_mode = os.environ.get('AIRBNB_DATA_MODE', 'memory')
+snapshot_path = os.environ.get('AIRBNB_SNAPSHOT_PATH', 'snapshot')
+
+# Most points a scatter plot or map sends to the browser; larger sets are sampled or binned
+point_budget = int(os.environ.get('AIRBNB_POINT_BUDGET', 5000))
+
+# Read the Advanced Analysis charts from the airbnb_rollup view when the range sliders are untouched
+use_summaries = os.environ.get('AIRBNB_USE_SUMMARIES') == '1'
+
+# Show how long each data call, chart and page of a rerun took in the sidebar
+show_timings = os.environ.get('AIRBNB_TIMINGS') == '1'
+
+def get_engine():
+    """Process-wide pooled engine for AIRBNB_DATABASE_URL"""
+    return pooled_engine(DATABASE_URL)
+
+@st.cache_resource
+def get_listing_store():
+    """One store per server process, reused by all sessions and reruns"""
+    return ListingStore(get_engine())
+
+@st.cache_resource
+def get_sql_source():
+    return SqlListingSource(get_engine())
+
+@st.cache_resource
+def get_snapshot_source():
+    # Imported here so the Postgres modes do not need pyarrow
+    from snapshot import SnapshotSource
+    return SnapshotSource(snapshot_path)
+
+def get_source():
+    return {'sql': get_sql_source, 'snapshot': get_snapshot_source}.get(data_mode, get_listing_store)()
+
+@st.cache_resource
+def get_facets():
+    """Per-country option lists and ranges, shared by all sessions until the data version changes"""
+    return FacetService(get_source())
+
+@st.cache_resource
+def get_similar_listings():
+    """Per-country nearest-neighbour indexes for the Data Exploration detail view"""
+    return SimilarListings(get_source())
+
+@st.cache_resource
+def get_figure_cache():
+    """Charts and aggregates shared across sessions, keyed by filters and data version"""
+    return FigureCache()
 
 class StreamlitApp:
-    def __init__(self):
-        """Init Part"""
-        self.df = self.fetch_data()
-
-    def fetch_data(self):
-        """Fetch the data from the db"""
-        try:
-            engine = create_engine(f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}')
-            query = "SELECT * FROM airbnb;"
-            df = pd.read_sql_query(query, engine)
-        except Exception as e:
-            st.error(f"Error fetching data: {e}")
-            df = pd.DataFrame()
-        return df
-
-    def plot_room_type_distribution(self, df):
+    def __init__(self, source=None, facets=None, similar_listings=None, figure_cache=None, timer=None):
+        """Init Part; the arguments replace the process-wide defaults, e.g. in benchmark.py.
+
+        Facets and similar listings not passed in are built over an injected
+        source, so every page reads the same backend.
+        """
+        self.source = source if source is not None else get_source()
+        # Sidebar options and slider bounds
+        if facets is None:
+            facets = get_facets() if source is None else FacetService(source)
+        self.facets = facets
+        # Nearest neighbours for the Data Exploration detail view
+        if similar_listings is None:
+            similar_listings = get_similar_listings() if source is None else SimilarListings(source)
+        self.similar_listings = similar_listings
+        # Looked up here so cached() also works on query pool threads
+        self.figure_cache = figure_cache if figure_cache is not None else get_figure_cache()
+        self.timer = timer if timer is not None else (StepTimer() if show_timings else None)
+        if self.timer is not None:
+            self.source = TimedProxy(self.source, self.timer, 'source')
+            self.facets = TimedProxy(self.facets, self.timer, 'facets')
+            self.similar_listings = TimedProxy(self.similar_listings, self.timer, 'similar_listings')
+
+    def cached(self, name, filters, compute):
+        """Reuse a chart or aggregate computed earlier for the same filters and data"""
+        key = (name, self.source.data_version(), normalize_filters(filters))
+        if self.timer is not None:
+            # Only cache misses run compute, so only they show up in the timings
+            compute = functools.partial(self.timer.call, f'compute.{name}', compute)
+        return self.figure_cache.get_or_compute(key, compute)
+
+    def plot_room_type_distribution(self, room_type_counts):
         """to count romm type for advance page """
-        room_type_counts = df['room_type'].value_counts().reset_index()
-        room_type_counts.columns = ['room_type', 'count']
-        
         fig = px.sunburst(room_type_counts, path=['room_type'], values='count',
                           title='Room Type Distribution')
         return fig
 
-    def plot_price_heatmap(self, df):
+    def plot_price_heatmap(self, price_matrix):
         """To create heatmap for the room&property type vs price for advance page"""
-        pivot = df.pivot_table(values='price', index='property_type', columns='room_type', aggfunc='mean')
-        fig = px.imshow(pivot, text_auto=True, aspect="auto",
+        fig = px.imshow(price_matrix, text_auto=True, aspect="auto",
                         title="Average Price Heatmap by Property Type and Room Type")
         fig.update_xaxes(title="Room Type")
         fig.update_yaxes(title="Property Type")
         return fig
 
-    def plot_radar_chart(self, df, hotel_name):
+    def plot_radar_chart(self, hotel):
         """To create radar chart to data expol page"""
-        if hotel_name not in df['name'].values:
-            return go.Figure()
-
-        hotel = df[df['name'] == hotel_name].iloc[0]
+        hotel_name = hotel['name']
         categories = ['price', 'number_of_reviews', 'review_scores_rating']
         values = [hotel[cat] for cat in categories]
         fig = go.Figure()
@@ -63,50 +134,81 @@ class StreamlitApp:
 
         return fig
 
-    def plot_advanced_map(self, df, map_style='light'):
+    def plot_advanced_map(self, df, map_style='light', point_budget=None, view=None):
         """tO show world for the map page view"""
-        df = df[['latitude', 'longitude', 'price', 'name', 'number_of_reviews', 'review_scores_rating']]
-        
-        layer = pdk.Layer(
-            'ScatterplotLayer',
-            data=df,
-            get_position=['longitude', 'latitude'],
-            get_fill_color='[200, 30, 0, 160]',
-            get_radius='price / 10',
-            radius_min_pixels=1,
-            radius_max_pixels=100,
-            pickable=True,
-            auto_highlight=True
-        )
+        if 'count' in df.columns:
+            # Already clustered per tile by the data source
+            cells = df
+        elif point_budget is not None and len(df) > point_budget:
+            # Too many points to ship: send grid cells and let a hexagon layer sum their counts
+            cells = grid_aggregate(df, point_budget)
+        else:
+            cells = None
+            df = df[['latitude', 'longitude', 'price', 'name', 'number_of_reviews', 'review_scores_rating']]
+
+        if cells is not None:
+            layer = pdk.Layer(
+                'HexagonLayer',
+                data=cells,
+                get_position=['longitude', 'latitude'],
+                get_elevation_weight='count',
+                elevation_aggregation='SUM',
+                get_color_weight='count',
+                color_aggregation='SUM',
+                radius=float(max(cells.attrs['cell_size'][0] * 111_000 / 2, 50)),
+                pickable=True,
+                auto_highlight=True
+            )
+            tooltip = {'text': 'Listings: {elevationValue}'}
+        else:
+            layer = pdk.Layer(
+                'ScatterplotLayer',
+                data=df,
+                get_position=['longitude', 'latitude'],
+                get_fill_color='[200, 30, 0, 160]',
+                get_radius='price / 10',
+                radius_min_pixels=1,
+                radius_max_pixels=100,
+                pickable=True,
+                auto_highlight=True
+            )
+            tooltip = {
+                'text': '{name}\nPrice: ${price}\nReviews: {number_of_reviews}\nRating: {review_scores_rating}'
+            }
         
-        view = pdk.ViewState(
-            latitude=df['latitude'].mean(),
-            longitude=df['longitude'].mean(),
-            zoom=11,
-            pitch=0
-        )
+        if view is None:
+            view = pdk.ViewState(
+                latitude=df['latitude'].mean(),
+                longitude=df['longitude'].mean(),
+                zoom=11,
+                pitch=0
+            )
         
         deck = pdk.Deck(
             layers=[layer],
             initial_view_state=view,
             map_style=map_style,
-            tooltip={
-                'text': '{name}\nPrice: ${price}\nReviews: {number_of_reviews}\nRating: {review_scores_rating}'
-            }
+            tooltip=tooltip
         )
         return deck
 
-    def plot_price_distribution_by_property(self, df):
-        """"""
-        fig = px.histogram(df, x='price', color='property_type', nbins=50,
-                           title='Price Distribution by Property Type',
-                           labels={'price': 'Price'})
+    def plot_price_distribution_by_property(self, price_histogram):
+        """Stacked price histogram from the pre-binned counts"""
+        fig = go.Figure()
+        for property_type, bins in price_histogram.groupby('property_type', sort=False):
+            fig.add_trace(go.Bar(x=(bins['price_start'] + bins['price_end']) / 2, y=bins['count'],
+                                 width=bins['price_end'] - bins['price_start'], name=str(property_type)))
+        fig.update_layout(barmode='stack', bargap=0, title='Price Distribution by Property Type',
+                          xaxis_title='Price', yaxis_title='count', legend_title_text='property_type')
         return fig
 
-    def plot_review_score_distribution(self, df):
-        fig = px.histogram(df, x='review_scores_rating', nbins=20,
-                           title='Distribution of Review Scores',
-                           labels={'review_scores_rating': 'Review Scores Rating'})
+    def plot_review_score_distribution(self, review_score_histogram):
+        fig = go.Figure(go.Bar(
+            x=(review_score_histogram['review_scores_start'] + review_score_histogram['review_scores_end']) / 2,
+            y=review_score_histogram['count'],
+            width=review_score_histogram['review_scores_end'] - review_score_histogram['review_scores_start']))
+        fig.update_layout(bargap=0, title='Distribution of Review Scores',
+                          xaxis_title='Review Scores Rating', yaxis_title='count')
         return fig
 
     def plot_price_vs_review_scores(self, df):
@@ -116,25 +218,17 @@ class StreamlitApp:
                          labels={'review_scores_rating': 'Review Scores Rating', 'price': 'Price'})
         return fig
 
-    def plot_cancellation_policy_distribution(self, df):
-        # Count the number of hotels for each cancellation policy
-        cancellation_policy_counts = df['cancellation_policy'].value_counts().reset_index()
-        cancellation_policy_counts.columns = ['cancellation_policy', 'number_of_hotels']
-
+    def plot_cancellation_policy_distribution(self, cancellation_policy_counts):
         fig = px.bar(cancellation_policy_counts, x='cancellation_policy', y='number_of_hotels',
                      title='Number of Hotels by Cancellation Policy',
                      labels={'cancellation_policy': 'Cancellation Policy', 'number_of_hotels': 'Number of Hotels'})
         return fig
 
-    def plot_availability_vs_hotels(self, df):
-        # Create a new DataFrame to aggregate the number of hotels by availability
-        availability_columns = ['availability_30', 'availability_60', 'availability_90', 'availability_365']
-        availability_dfs = [df[['country'] + [col]].groupby(col).size().reset_index(name='number_of_hotels') for col in
-                            availability_columns]
-
+    def plot_availability_vs_hotels(self, availability):
+        # One line per availability window, from the per-day hotel counts
         fig = go.Figure()
 
-        for availability_df, availability_col in zip(availability_dfs, availability_columns):
+        for availability_col, availability_df in availability.items():
             fig.add_trace(go.Scatter(
                 x=availability_df[availability_col],
                 y=availability_df['number_of_hotels'],
@@ -215,18 +309,21 @@ class StreamlitApp:
 
         # Sidebar Filter
         st.sidebar.subheader("Filter Options")
-        countries = self.df['country'].unique()
+        countries = self.facets.options('country', {})
         selected_country = st.sidebar.selectbox('Select Country:', countries, index=0)
-        filtered_df = self.df[self.df['country'] == selected_country]
+        filters = {'country': selected_country}
 
-        if filtered_df.empty:
+        min_price, max_price = self.facets.value_range('price', filters)
+
+        if pd.isna(min_price) or pd.isna(max_price):
             st.write("No listings available for the selected country.")
             return
 
-        min_price, max_price = int(filtered_df['price'].min()), int(filtered_df['price'].max())
+        min_price, max_price = int(min_price), int(max_price)
         selected_min_price = st.sidebar.slider('Select Minimum Price:', min_value=min_price, max_value=max_price, value=min_price)
         selected_max_price = st.sidebar.slider('Select Maximum Price:', min_value=min_price, max_value=max_price, value=max_price)
-        filtered_df = filtered_df[(filtered_df['price'] >= selected_min_price) & (filtered_df['price'] <= selected_max_price)]
+        filters['price'] = (selected_min_price, selected_max_price)
+        filtered_df = self.source.rows(EXPLORATION_COLUMNS, filters)
 
         if filtered_df.empty:
             st.write("No listings available for the selected price range.")
@@ -235,136 +332,210 @@ class StreamlitApp:
         st.write(f"Displaying {len(filtered_df)} listings")
 
         st.subheader("Filtered Hotels and Prices")
-        hotel_list = filtered_df[['name', 'price']]
-        selected_hotel = st.selectbox("Select a hotel to view details:", hotel_list['name'])
-
-        if selected_hotel:
-            st.write(f"Details for {selected_hotel}")
-            st.dataframe(filtered_df[filtered_df['name'] == selected_hotel][['name', 'price', 'number_of_reviews', 'review_scores_rating']])
-            st.plotly_chart(self.plot_radar_chart(filtered_df, selected_hotel), use_container_width=True)
+        # _id -> row position; names are not unique
+        listing_positions = pd.Index(filtered_df['_id'].to_numpy())
+        hotel_names = filtered_df['name'].to_numpy()
+        selected_id = st.selectbox("Select a hotel to view details:", listing_positions,
+                                   format_func=lambda listing_id: hotel_names[listing_positions.get_loc(listing_id)])
+
+        if selected_id is not None:
+            hotel = filtered_df.iloc[[listing_positions.get_loc(selected_id)]]
+            st.write(f"Details for {hotel['name'].iloc[0]}")
+            st.dataframe(hotel[['name', 'price', 'number_of_reviews', 'review_scores_rating']])
+            st.plotly_chart(self.plot_radar_chart(hotel.iloc[0]), use_container_width=True)
+
+            st.subheader("Similar Listings")
+            similar = self.similar_listings.similar(selected_country, selected_id)
+            if similar.empty:
+                st.write("No similar listings found.")
+            else:
+                st.dataframe(similar[['name', 'property_type', 'room_type', 'price', 'accommodates', 'bedrooms',
+                                      'number_of_reviews', 'review_scores_rating', 'distance']],
+                             hide_index=True)
 
     def advanced_analysis_page(self):
         st.title("Advanced Analysis")
 
         st.sidebar.subheader("Filter Options")
 
-        countries = self.df['country'].unique()
+        countries = self.facets.options('country', {})
         selected_country = st.sidebar.selectbox('Select Country:', countries, index=0)
-        filtered_df = self.df[self.df['country'] == selected_country]
+        filters = {'country': selected_country}
 
-        if filtered_df.empty:
+        property_types = self.facets.options('property_type', filters)
+
+        if not property_types:
             st.write("No listings available for the selected country.")
             return
 
-        property_types = filtered_df['property_type'].unique()
         selected_property_types = st.sidebar.multiselect('Select Property Type(s):', property_types, default=property_types)
-        filtered_df = filtered_df[filtered_df['property_type'].isin(selected_property_types)]
+        filters['property_type'] = selected_property_types
 
-        room_types = filtered_df['room_type'].unique()
+        room_types = self.facets.options('room_type', filters)
         selected_room_types = st.sidebar.multiselect('Select Room Type(s):', room_types, default=room_types)
-        filtered_df = filtered_df[filtered_df['room_type'].isin(selected_room_types)]
+        filters['room_type'] = selected_room_types
 
-        min_price, max_price = filtered_df['price'].min(), filtered_df['price'].max()
+        min_price, max_price = self.facets.value_range('price', filters)
         
         if pd.isna(min_price) or pd.isna(max_price):
             st.write("Price data is missing or invalid.")
             return
 
-        min_price, max_price = int(min_price), int(max_price)
+        # Whole-number bounds that still cover every price, so the sliders' full range excludes nothing
+        min_price, max_price = math.floor(min_price), math.ceil(max_price)
         
         selected_min_price = st.sidebar.slider('Select Minimum Price:', min_value=min_price, max_value=max_price, value=min_price)
         selected_max_price = st.sidebar.slider('Select Maximum Price:', min_value=min_price, max_value=max_price, value=max_price)
-        filtered_df = filtered_df[(filtered_df['price'] >= selected_min_price) & (filtered_df['price'] <= selected_max_price)]
+        filters['price'] = (selected_min_price, selected_max_price)
 
-        if filtered_df.empty:
-            st.write("No listings available for the selected price range.")
-            return
-
-        min_reviews, max_reviews = filtered_df['number_of_reviews'].min(), filtered_df['number_of_reviews'].max()
+        min_reviews, max_reviews = self.facets.value_range('number_of_reviews', filters)
         
         if pd.isna(min_reviews) or pd.isna(max_reviews):
-            st.write("Number of reviews data is missing or invalid.")
+            st.write("No listings available for the selected price range.")
             return
         
         min_reviews, max_reviews = int(min_reviews), int(max_reviews)
         
         selected_min_reviews = st.sidebar.slider('Select Minimum Number of Reviews:', min_value=min_reviews, max_value=max_reviews, value=min_reviews)
         selected_max_reviews = st.sidebar.slider('Select Maximum Number of Reviews:', min_value=min_reviews, max_value=max_reviews, value=max_reviews)
-        filtered_df = filtered_df[(filtered_df['number_of_reviews'] >= selected_min_reviews) & (filtered_df['number_of_reviews'] <= selected_max_reviews)]
+        filters['number_of_reviews'] = (selected_min_reviews, selected_max_reviews)
+        # Rows are only fetched if some chart below is not cached yet
+        filtered_rows = functools.cache(lambda: self.source.rows(ANALYSIS_COLUMNS, filters))
+        full_range = ((selected_min_price, selected_max_price) == (min_price, max_price)
+                      and (selected_min_reviews, selected_max_reviews) == (min_reviews, max_reviews))
+        price_vs_review_scores = functools.cache(lambda: self.cached(
+            'price_vs_review_scores', filters,
+            lambda: self.plot_price_vs_review_scores(stratified_sample(filtered_rows(), point_budget))))
+        if use_summaries and full_range and data_mode != 'snapshot':
+            # The sliders exclude nothing, so the rollup for the selected types has the same counts.
+            # Only the scatter still needs rows; both queries run side by side.
+            engine = get_engine()
+            summary, _ = gather(lambda: self.cached('analysis_summary_rollup', filters,
+                                                    lambda: summarize_rollup(read_rollup(engine, filters))),
+                                price_vs_review_scores)
+            analysis_summary = lambda: summary
+            listing_count = summary['listing_count']
+        else:
+            listing_count = self.cached('listing_count', filters, lambda: len(filtered_rows()))
+            analysis_summary = functools.cache(lambda: self.cached('analysis_summary', filters,
+                                                                   lambda: summarize(filtered_rows())))
 
-        if filtered_df.empty:
+        if listing_count == 0:
             st.write("No listings available for the selected number of reviews.")
             return
 
-        st.write(f"Displaying {len(filtered_df)} listings")
+        st.write(f"Displaying {listing_count} listings")
 
-        if len(filtered_df) > 0:
+        if listing_count > 0:
 
             st.subheader("Room Type Distribution")
-            st.plotly_chart(self.plot_room_type_distribution(filtered_df), use_container_width=True)
+            st.plotly_chart(self.cached('room_type_distribution', filters,
+                                        lambda: self.plot_room_type_distribution(analysis_summary()['room_type_counts'])),
+                            use_container_width=True)
 
             st.subheader("Price Heatmap")
-            st.plotly_chart(self.plot_price_heatmap(filtered_df), use_container_width=True)
+            st.plotly_chart(self.cached('price_heatmap', filters,
+                                        lambda: self.plot_price_heatmap(analysis_summary()['price_matrix'])),
+                            use_container_width=True)
 
             col3, col4 = st.columns(2)
 
             with col3:
                 st.subheader("Price Distribution by Property Type")
-                st.plotly_chart(self.plot_price_distribution_by_property(filtered_df), use_container_width=True)
+                st.plotly_chart(self.cached('price_distribution_by_property', filters,
+                                            lambda: self.plot_price_distribution_by_property(analysis_summary()['price_histogram'])),
+                                use_container_width=True)
 
             with col4:
                 st.subheader("Review Score Distribution")
-                st.plotly_chart(self.plot_review_score_distribution(filtered_df), use_container_width=True)
+                st.plotly_chart(self.cached('review_score_distribution', filters,
+                                            lambda: self.plot_review_score_distribution(analysis_summary()['review_score_histogram'])),
+                                use_container_width=True)
 
             st.subheader("Price vs Review Scores")
-            st.plotly_chart(self.plot_price_vs_review_scores(filtered_df), use_container_width=True)
+            st.plotly_chart(price_vs_review_scores(), use_container_width=True)
 
             st.subheader("Cancellation Policy Distribution")
-            st.plotly_chart(self.plot_cancellation_policy_distribution(filtered_df), use_container_width=True)
+            st.plotly_chart(self.cached('cancellation_policy_distribution', filters,
+                                        lambda: self.plot_cancellation_policy_distribution(analysis_summary()['cancellation_counts'])),
+                            use_container_width=True)
 
             st.subheader("Availability vs Number of Hotels")
-            st.plotly_chart(self.plot_availability_vs_hotels(filtered_df), use_container_width=True)
+            st.plotly_chart(self.cached('availability_vs_hotels', filters,
+                                        lambda: self.plot_availability_vs_hotels(analysis_summary()['availability'])),
+                            use_container_width=True)
 
         else:
             st.write("No data available for the selected filters.")
 
 
+    def world_map_view(self):
+        """All markets, limited to the viewport picked in the sidebar"""
+        st.sidebar.subheader("Viewport")
+        zoom = st.sidebar.slider('Zoom:', min_value=1, max_value=16, value=2)
+        center_latitude = st.sidebar.slider('Center Latitude:', min_value=-85.0, max_value=85.0, value=20.0)
+        center_longitude = st.sidebar.slider('Center Longitude:', min_value=-180.0, max_value=180.0, value=0.0)
+        selected_map_style = st.sidebar.selectbox('Select Map Style:', ['light', 'dark'], index=0)
+
+        bbox = viewport(center_latitude, center_longitude, zoom)
+        map_df = self.source.map_view(bbox, zoom, point_budget)
+
+        if map_df.empty:
+            st.write("No listings inside the selected viewport.")
+            return
+
+        if 'count' in map_df.columns:
+            st.write(f"Displaying {int(map_df['count'].sum())} listings in {len(map_df)} clusters")
+        else:
+            st.write(f"Displaying {len(map_df)} listings on the map")
+        view = pdk.ViewState(latitude=center_latitude, longitude=center_longitude, zoom=zoom, pitch=0)
+        st.pydeck_chart(self.plot_advanced_map(map_df, map_style=selected_map_style, view=view))
+
     def map_page(self):
         try:
             st.title("Map Visualization")
 
+            if st.sidebar.radio('Map Extent:', ['Selected Country', 'All Markets']) == 'All Markets':
+                self.world_map_view()
+                return
+
             # Sidebar FIlters
             st.sidebar.subheader("Filter Options")
 
-            countries = self.df['country'].unique()
+            countries = self.facets.options('country', {})
             selected_country = st.sidebar.selectbox('Select Country:', countries, index=0)
-            filtered_df = self.df[self.df['country'] == selected_country]
+            filters = {'country': selected_country}
 
-            if filtered_df.empty:
+            property_types = self.facets.options('property_type', filters)
+
+            if not property_types:
                 st.write("No listings available for the selected country.")
                 return
 
-            property_types = filtered_df['property_type'].unique()
             selected_property_type = st.sidebar.selectbox('Select Property Type:', property_types, index=0)
-            filtered_df = filtered_df[filtered_df['property_type'] == selected_property_type]
+            filters['property_type'] = selected_property_type
 
-            room_types = filtered_df['room_type'].unique()
+            room_types = self.facets.options('room_type', filters)
             selected_room_types = st.sidebar.multiselect('Select Room Type(s):', room_types, default=room_types)
-            filtered_df = filtered_df[filtered_df['room_type'].isin(selected_room_types)]
+            filters['room_type'] = selected_room_types
 
-            min_price, max_price = int(filtered_df['price'].min()), int(filtered_df['price'].max())
+            min_price, max_price = self.facets.value_range('price', filters)
+            min_price, max_price = int(min_price), int(max_price)
             selected_min_price = st.sidebar.slider('Select Minimum Price:', min_value=min_price, max_value=max_price, value=min_price)
             selected_max_price = st.sidebar.slider('Select Maximum Price:', min_value=min_price, max_value=max_price, value=max_price)
-            filtered_df = filtered_df[(filtered_df['price'] >= selected_min_price) & (filtered_df['price'] <= selected_max_price)]
+            filters['price'] = (selected_min_price, selected_max_price)
 
-            if filtered_df.empty:
+            min_reviews, max_reviews = self.facets.value_range('number_of_reviews', filters)
+
+            if pd.isna(min_reviews) or pd.isna(max_reviews):
                 st.write("No listings available for the selected price range.")
                 return
 
-            min_reviews, max_reviews = int(filtered_df['number_of_reviews'].min()), int(filtered_df['number_of_reviews'].max())
+            min_reviews, max_reviews = int(min_reviews), int(max_reviews)
             selected_min_reviews = st.sidebar.slider('Select Minimum Number of Reviews:', min_value=min_reviews, max_value=max_reviews, value=min_reviews)
             selected_max_reviews = st.sidebar.slider('Select Maximum Number of Reviews:', min_value=min_reviews, max_value=max_reviews, value=max_reviews)
-            filtered_df = filtered_df[(filtered_df['number_of_reviews'] >= selected_min_reviews) & (filtered_df['number_of_reviews'] <= selected_max_reviews)]
+            filters['number_of_reviews'] = (selected_min_reviews, selected_max_reviews)
+            filtered_df = self.source.rows(MAP_COLUMNS, filters)
 
             if filtered_df.empty:
                 st.write("No listings available for the selected number of reviews.")
@@ -375,7 +546,8 @@ class StreamlitApp:
             st.write(f"Displaying {len(filtered_df)} listings on the map")
 
             if len(filtered_df) > 0:
-                st.pydeck_chart(self.plot_advanced_map(filtered_df, map_style=selected_map_style))
+                st.pydeck_chart(self.plot_advanced_map(filtered_df, map_style=selected_map_style,
+                                                       point_budget=point_budget))
             else:
                 st.write("No data available for the selected filters.")
 
@@ -388,7 +560,7 @@ class StreamlitApp:
         search_term = st.text_input("Enter search term (e.g., name, neighborhood, amenities):")
 
         if search_term:
-            search_results = self.df[self.df.apply(lambda row: row.astype(str).str.contains(search_term, case=False).any(), axis=1)]
+            search_results = self.source.search(search_term)
             st.write(f"Displaying {len(search_results)} listings matching '{search_term}'")
             if len(search_results) > 0:
                 st.dataframe(search_results)
@@ -419,18 +591,33 @@ class StreamlitApp:
             st.sidebar.title("Navigation")
             options = st.sidebar.radio("Choose a page", ["Home", "Data Exploration", "Advanced Analysis", "Map", "Search"])
 
-            if options == "Home":
-                self.home_page()
-            elif options == "Data Exploration":
-                self.data_exploration_page()
-            elif options == "Advanced Analysis":
-                self.advanced_analysis_page()
-            elif options == "Map":
-                self.map_page()
-            elif options == "Search":
-                self.search_page()
+            with contextlib.nullcontext() if self.timer is None else self.timer.step(f'page.{options}'):
+                if options == "Home":
+                    self.home_page()
+                elif options == "Data Exploration":
+                    self.data_exploration_page()
+                elif options == "Advanced Analysis":
+                    self.advanced_analysis_page()
+                elif options == "Map":
+                    self.map_page()
+                elif options == "Search":
+                    self.search_page()
         except Exception as e:
             st.write("No data available for the selected filters.")
+        if self.timer is not None:
+            self.timing_overlay()
+
+    def timing_overlay(self):
+        """Where this rerun spent its time, slowest first, how the chart cache did and what the cached table costs"""
+        timings = self.timer.frame()
+        with st.sidebar.expander("Timings", expanded=True):
+            if not timings.empty:
+                st.dataframe(timings.sort_values('seconds', ascending=False), hide_index=True)
+            st.write(self.figure_cache.stats())
+            # Only the in-memory store keeps a compacted copy of the table
+            report = getattr(self.source, 'memory_report', None)
+            if report is not None:
+                st.dataframe(report)
 
 if __name__ == "__main__":
     #main Function
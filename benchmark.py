@@ -0,0 +1,307 @@
+"""Benchmark the dashboard's data paths on synthetic airbnb tables.
+
+    python benchmark.py --rows 10000 100000 1000000 --backends memory snapshot
+
+Builds a table with the notebook's schema at each size and runs every
+page method of the app on it headlessly, in Streamlit's bare mode with the
+sidebar widgets answered by the benchmark: no browser, no Streamlit server
+and no Postgres. Each size and backend runs in its own process. Every step
+is written as one JSON line (rows, backend, visit, step, seconds,
+peak_bytes and, for charts, payload_bytes) to --output, followed by the
+run's peak RSS, and a per-step summary is printed.
+"""
+import argparse
+import contextlib
+import functools
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import warnings
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+
+import app
+from figure_cache import FigureCache
+from instrumentation import StepTimer
+from listing_store import ListingStore
+from schema import COLUMN_TYPES, compact_frame
+
+# Country: (share of listings, latitude, longitude)
+COUNTRIES = {
+    'United States': (0.25, 40.7, -74.0), 'Turkey': (0.12, 41.0, 28.9), 'Canada': (0.11, 45.5, -73.6),
+    'Spain': (0.11, 41.4, 2.2), 'Australia': (0.11, -33.9, 151.2), 'Brazil': (0.10, -22.9, -43.2),
+    'Hong Kong': (0.08, 22.3, 114.2), 'Portugal': (0.07, 41.2, -8.6), 'China': (0.05, 22.5, 114.1),
+}
+PROPERTY_TYPES = ['Apartment', 'House', 'Condominium', 'Serviced apartment', 'Loft', 'Townhouse', 'Guest suite',
+                  'Bed and breakfast', 'Hostel', 'Guesthouse', 'Villa', 'Boutique hotel', 'Hotel', 'Cottage',
+                  'Bungalow', 'Cabin', 'Chalet', 'Boat', 'Camper/RV', 'Tiny house']
+ROOM_TYPES = ['Entire home/apt', 'Private room', 'Shared room']
+BED_TYPES = ['Real Bed', 'Pull-out Sofa', 'Futon', 'Couch', 'Airbed']
+CANCELLATION_POLICIES = ['strict_14_with_grace_period', 'moderate', 'flexible', 'super_strict_30',
+                         'super_strict_60']
+RESPONSE_TIMES = ['within an hour', 'within a few hours', 'within a day', 'a few days or more']
+WORDS = ['cozy', 'bright', 'spacious', 'quiet', 'modern', 'charming', 'central', 'beach', 'downtown', 'studio',
+         'loft', 'garden', 'view', 'balcony', 'pool', 'family', 'historic', 'walk', 'metro', 'park', 'wifi',
+         'kitchen', 'terrace', 'ocean', 'river', 'old', 'town', 'near', 'private', 'room', 'apartment', 'house']
+# Distinct strings per text column; rows share them like real listings share phrases
+TEXT_POOL = 4096
+# A word common to most listings, a phrase of two mid-frequency words and a rare word
+SEARCH_TERMS = ['cozy', 'beach studio', 'house']
+# Every page visit selects the market with the most listings
+MARKET = max(COUNTRIES, key=lambda name: COUNTRIES[name][0])
+SEARCH_LABEL = "Enter search term (e.g., name, neighborhood, amenities):"
+WIDGETS = ('selectbox', 'multiselect', 'slider', 'radio', 'text_input')
+
+
+def _text_pool(rng, words_per_text):
+    # Word frequencies fall off like real vocabularies, so searches match anything from most to few listings
+    weights = 1.0 / np.arange(1, len(WORDS) + 1) ** 2
+    words = np.array(WORDS, dtype=object)[rng.choice(len(WORDS), (TEXT_POOL, words_per_text),
+                                                     p=weights / weights.sum())]
+    return np.array([' '.join(row) for row in words], dtype=object)
+
+
+def synthetic_listings(rows, seed=0):
+    """Raw airbnb table with the notebook's columns, as read_sql would return it"""
+    rng = np.random.default_rng(seed)
+    names = list(COUNTRIES)
+    shares = np.array([COUNTRIES[name][0] for name in names])
+    country = rng.choice(len(names), rows, p=shares / shares.sum())
+    center = np.array([COUNTRIES[name][1:] for name in names])[country]
+    property_weights = 1.0 / np.arange(1, len(PROPERTY_TYPES) + 1) ** 1.5
+    reviews = rng.geometric(0.05, rows) - 1
+    reviewed = reviews > 0
+
+    def integers(low, high):
+        return rng.integers(low, high, rows)
+
+    def texts(words_per_text):
+        return _text_pool(rng, words_per_text)[integers(0, TEXT_POOL)]
+
+    def with_missing(values, share):
+        values = values.astype('float64')
+        values[rng.random(rows) < share] = np.nan
+        return values
+
+    columns = {
+        '_id': np.arange(1, rows + 1),
+        'listing_url': np.char.add('https://www.airbnb.com/rooms/', np.arange(rows).astype(str)).astype(object),
+        'name': texts(4), 'summary': texts(20),
+        'property_type': np.array(PROPERTY_TYPES, dtype=object)[
+            rng.choice(len(PROPERTY_TYPES), rows, p=property_weights / property_weights.sum())],
+        'room_type': np.array(ROOM_TYPES, dtype=object)[rng.choice(3, rows, p=[0.6, 0.37, 0.03])],
+        'bed_type': np.array(BED_TYPES, dtype=object)[rng.choice(5, rows, p=[0.9, 0.04, 0.03, 0.02, 0.01])],
+        'minimum_nights': rng.choice([1, 2, 3, 7, 30], rows), 'maximum_nights': rng.choice([30, 365, 1125], rows),
+        'cancellation_policy': np.array(CANCELLATION_POLICIES, dtype=object)[integers(0, 5)],
+        'last_scraped': pd.Timestamp('2019-02-16') + pd.to_timedelta(integers(0, 30), 'D'),
+        'calendar_last_scraped': pd.Timestamp('2019-02-16') + pd.to_timedelta(integers(0, 30), 'D'),
+        'accommodates': integers(1, 17), 'bedrooms': with_missing(integers(0, 6), 0.01),
+        'beds': with_missing(integers(1, 9), 0.01), 'number_of_reviews': reviews,
+        'bathrooms': with_missing(rng.choice([1.0, 1.5, 2.0, 2.5, 3.0], rows), 0.01),
+        'price': np.round(rng.lognormal(4.6, 0.8, rows)), 'security_deposit': with_missing(integers(0, 500), 0.3),
+        'cleaning_fee': with_missing(integers(0, 200), 0.25), 'extra_people': integers(0, 50),
+        'guests_included': integers(1, 5), 'weekly_price': with_missing(integers(100, 3000), 0.85),
+        'monthly_price': with_missing(integers(500, 10000), 0.85),
+        'reviews_per_month': np.where(reviewed, np.round(rng.gamma(1.5, 1.0, rows), 2), np.nan),
+        'host_id': integers(1, max(rows // 3, 2)).astype(str).astype(object), 'amenities': texts(30),
+        'host_url': np.char.add('https://www.airbnb.com/users/show/', integers(1, 10 ** 8).astype(str)).astype(object),
+        'host_name': texts(1), 'host_location': texts(2), 'host_about': texts(25),
+        'host_response_time': np.array(RESPONSE_TIMES + [None], dtype=object)[integers(0, 5)],
+        'host_neighbourhood': texts(2), 'host_response_rate': with_missing(integers(50, 101), 0.3),
+        'host_is_superhost': rng.random(rows) < 0.2, 'host_has_profile_pic': rng.random(rows) < 0.99,
+        'host_identity_verified': rng.random(rows) < 0.5, 'host_listings_count': integers(1, 50),
+        'host_total_listings_count': integers(1, 50), 'street': texts(3), 'suburb': texts(2),
+        'government_area': np.char.add(np.array(names)[country], integers(0, 20).astype(str)).astype(object),
+        'market': np.array(names, dtype=object)[country], 'country': np.array(names, dtype=object)[country],
+        'country_code': np.array([name[:2].upper() for name in names], dtype=object)[country],
+        'location_type': np.full(rows, 'Point', dtype=object),
+        'latitude': center[:, 0] + rng.normal(0, 0.08, rows), 'longitude': center[:, 1] + rng.normal(0, 0.1, rows),
+        'location_is_location_exact': rng.random(rows) < 0.8,
+        'availability_30': integers(0, 31), 'availability_60': integers(0, 61), 'availability_90': integers(0, 91),
+        'availability_365': integers(0, 366),
+        'review_scores_rating': np.where(reviewed, np.clip(np.round(100 - rng.exponential(6, rows)), 20, 100), np.nan),
+    }
+    for column in ('review_scores_accuracy', 'review_scores_cleanliness', 'review_scores_checkin',
+                   'review_scores_communication', 'review_scores_location', 'review_scores_value'):
+        columns[column] = np.where(reviewed, np.clip(np.round(10 - rng.exponential(0.6, rows)), 2, 10), np.nan)
+    return pd.DataFrame({column: columns[column] for column in COLUMN_TYPES})
+
+
+class FrameStore(ListingStore):
+    """ListingStore over a frame in this process instead of the airbnb table"""
+
+    def __init__(self, raw):
+        super().__init__(engine=None, ttl=float('inf'))
+        self.raw = raw
+        self.version = (len(raw), 'synthetic', None)
+
+    def read_table(self):
+        # Handed over once, so the raw table is freed after load like a query result
+        raw, self.raw = self.raw, None
+        return raw
+
+    def current_version(self):
+        return self.version
+
+
+def _source(backend, raw, timer, directory):
+    if backend == 'memory':
+        store = FrameStore(raw)
+        timer.call('load', store.refresh)
+        return store
+    from snapshot import SnapshotSource, write_snapshot
+    timer.call('load', lambda: write_snapshot(compact_frame(raw).groupby('country', observed=True), directory,
+                                              (len(raw), 'synthetic', None)))
+    return SnapshotSource(directory)
+
+
+def visits():
+    """(page step, page method, widget values) of every visit, all in the largest market"""
+    latitude, longitude = COUNTRIES[MARKET][1:]
+    market = {'Select Country:': MARKET}
+    yield 'Data Exploration', 'data_exploration_page', market
+    yield 'Advanced Analysis', 'advanced_analysis_page', market
+    yield 'Map', 'map_page', {'Map Extent:': 'Selected Country', **market}
+    for zoom in (2, 11):
+        yield f'Map.zoom{zoom}', 'map_page', {'Map Extent:': 'All Markets', 'Zoom:': zoom,
+                                              'Center Latitude:': latitude, 'Center Longitude:': longitude}
+    # The first search builds the index
+    for term in SEARCH_TERMS:
+        yield f'Search.{term}', 'search_page', {SEARCH_LABEL: term}
+
+
+@contextlib.contextmanager
+def widget_values(values):
+    """Answer the widgets labelled in values with those values, outside any Streamlit session.
+
+    Every other widget returns its default, as in Streamlit's bare mode.
+    Raises if a value was never asked for, so a renamed widget cannot leave
+    the benchmark measuring the defaults.
+    """
+    unused = set(values)
+
+    def stub(original):
+        def widget(self, label, *args, **kwargs):
+            if label in values:
+                unused.discard(label)
+                return values[label]
+            return original(self, label, *args, **kwargs)
+        return widget
+
+    # st.text_input and friends are bound to the main area's DeltaGenerator, st.sidebar looks them up on the class
+    main = st.text_input.__self__
+    with contextlib.ExitStack() as stack:
+        for name in WIDGETS:
+            widget = stub(getattr(DeltaGenerator, name))
+            stack.enter_context(mock.patch.object(DeltaGenerator, name, widget))
+            stack.enter_context(mock.patch.object(st, name, functools.partial(widget, main)))
+        yield
+    if unused:
+        raise RuntimeError(f"The page never showed the widgets {sorted(unused)}")
+
+
+def run_pages(source, timer):
+    """Run every page method twice, as on a first visit and on a rerun, through the app's injected source"""
+    page = app.StreamlitApp(source=source, figure_cache=FigureCache(), timer=timer)
+    # Charts also record the size of the JSON they send to the browser
+    for name in dir(page):
+        if name.startswith('plot_'):
+            setattr(page, name, functools.partial(timer.call, name, getattr(page, name)))
+    for name, method, values in visits():
+        for visit in ('cold', 'warm'):
+            start = len(timer.records)
+            with widget_values(values), timer.step(f'page.{name}'):
+                getattr(page, method)()
+            for record in timer.records[start:]:
+                record['visit'] = visit
+
+
+def benchmark(rows, backend, trace_memory=True):
+    timer = StepTimer(trace_memory=trace_memory)
+    with tempfile.TemporaryDirectory() as directory:
+        source = _source(backend, timer.call('generate', synthetic_listings, rows), timer, directory)
+        run_pages(source, timer)
+    # Peak RSS of this process since it started, in KiB on Linux
+    timer.records.append({'step': 'process',
+                          'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024})
+    return [{'rows': rows, 'backend': backend, **record} for record in timer.records]
+
+
+def run_isolated(rows, backend, trace_memory):
+    """benchmark() in a fresh interpreter, so its peak RSS is its own; None if the run failed"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'records.jsonl')
+        command = [sys.executable, os.path.abspath(__file__), '--in-process', '--rows', str(rows),
+                   '--backends', backend, '--output', output, '--quiet']
+        if not trace_memory:
+            command.append('--no-memory')
+        result = subprocess.run(command)
+        if result.returncode != 0:
+            print(f"{backend} with {rows} rows failed with exit code {result.returncode}", file=sys.stderr)
+            return None
+        with open(output) as f:
+            return [json.loads(line) for line in f]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard data paths on synthetic tables")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--backends', nargs='+', default=['memory', 'snapshot'], choices=['memory', 'snapshot'])
+    parser.add_argument('--output', default='bench_output.txt', help="JSON lines file, '-' for stdout")
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc; faster, no peak_bytes")
+    parser.add_argument('--in-process', action='store_true',
+                        help="run every configuration in this process; max_rss_bytes is then cumulative")
+    parser.add_argument('--quiet', action='store_true', help="do not print the summary")
+    args = parser.parse_args()
+
+    # Pages run outside a Streamlit session
+    warnings.filterwarnings('ignore')
+    # Streamlit resets its loggers' levels when it loads its config, so switch them off instead
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith('streamlit'):
+            logging.getLogger(name).disabled = True
+
+    # Each run is written as soon as it finishes, so a larger size running out of memory keeps the smaller ones
+    records = []
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for rows in args.rows:
+            for backend in args.backends:
+                if args.in_process:
+                    run = benchmark(rows, backend, trace_memory=not args.no_memory)
+                else:
+                    run = run_isolated(rows, backend, trace_memory=not args.no_memory)
+                    if run is None:
+                        continue
+                output.writelines(json.dumps(record, default=float) + '\n' for record in run)
+                output.flush()
+                records += run
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if args.quiet or not records:
+        return
+
+    # Seconds per step and visit, summed over its calls, and each run's peak RSS
+    records = pd.DataFrame(records)
+    timed = records.dropna(subset=['seconds']).assign(visit=lambda df: df['visit'].fillna('setup'))
+    summary = pd.concat([
+        timed.pivot_table(index=['visit', 'step'], columns=['backend', 'rows'], values='seconds', aggfunc='sum',
+                          sort=False),
+        records.pivot_table(index='step', columns=['backend', 'rows'], values='max_rss_bytes').rename(
+            index={'process': ('process', 'max_rss_mb')}) / 2 ** 20,
+    ])
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.4f}'.format):
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+
+def stratified_sample(df, budget, by='property_type', seed=0):
+    """At most `budget` rows, each group keeping its share of the rows.
+
+    Every group gets one row first, largest groups first while the budget
+    lasts, so rare property types still show up in the legend; the rest of
+    the budget is shared in proportion to the rows each group has left. The
+    sample is deterministic for a given frame and seed, so reruns draw the
+    same points.
+    """
+    if len(df) <= budget:
+        return df
+    codes = df[by].astype('category').cat.codes.to_numpy()
+    codes = np.where(codes < 0, codes.max() + 1, codes)
+    group_sizes = np.bincount(codes)
+    groups = np.flatnonzero(group_sizes)
+    quotas = np.zeros(len(group_sizes), dtype=np.int64)
+    quotas[groups[np.argsort(-group_sizes[groups], kind='stable')][:budget]] = 1
+    left = group_sizes - quotas
+    quotas += left * (budget - quotas.sum()) // max(left.sum(), 1)
+
+    order = np.random.default_rng(seed).permutation(len(df))
+    shuffled = codes[order]
+    # Rank of each row within its group in the shuffled order
+    by_group = np.argsort(shuffled, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+    rank = np.empty(len(df), dtype=np.int64)
+    rank[by_group] = np.arange(len(df)) - np.repeat(starts, group_sizes)
+    keep = order[rank < quotas[shuffled]]
+    return df.take(np.sort(keep))
+
+
+def grid_aggregate(df, budget):
+    """Bucket points into at most `budget` lat/long cells.
+
+    Returns one row per non-empty cell with the mean position of its points,
+    the number of listings and their mean price.
+    """
+    df = df.dropna(subset=['latitude', 'longitude'])
+    side = max(int(np.sqrt(budget)), 1)
+    latitude = df['latitude'].to_numpy(dtype='float64')
+    longitude = df['longitude'].to_numpy(dtype='float64')
+    rows, cell_height = _cell(latitude, side)
+    columns, cell_width = _cell(longitude, side)
+    cells = pd.DataFrame({'cell': rows * side + columns, 'latitude': latitude, 'longitude': longitude,
+                          'price': df['price'].to_numpy(dtype='float64', na_value=np.nan)})
+    grouped = cells.groupby('cell', sort=False)
+    result = grouped[['latitude', 'longitude', 'price']].mean()
+    result['count'] = grouped.size()
+    result['price'] = result['price'].round(2)
+    result = result.reset_index(drop=True)
+    # Cell size in degrees, for layers that need a matching radius
+    result.attrs['cell_size'] = (cell_height, cell_width)
+    return result
+
+
+def _cell(values, side):
+    if not len(values):
+        return values.astype(np.int64), 1.0
+    low, high = values.min(), values.max()
+    width = (high - low) / side if high > low else 1.0
+    return np.clip(((values - low) / width).astype(np.int64), 0, side - 1), width
@@ -0,0 +1,304 @@
+"""Streaming loader for the airbnb JSON dump.
+
+Does what data_preprocessing.ipynb does, one record at a time: the dump is
+decoded incrementally, each listing is flattened into a table row once and
+rows are written to Postgres with COPY in fixed-size batches, so memory stays
+bounded by the batch size instead of the file size.
+
+    python etl.py sample_airbnb.json
+    python etl.py nightly_airbnb.json --incremental
+"""
+import argparse
+import io
+import json
+from datetime import datetime, timezone
+
+from data_access import DATABASE_URL, get_engine
+from queries import LISTING_INDEXES
+from schema import COLUMN_TYPES
+from summaries import build_summaries
+
+COLUMNS = list(COLUMN_TYPES)
+INTEGER_COLUMNS = [column for column, sql_type in COLUMN_TYPES.items() if sql_type == 'INTEGER']
+
+LISTING_FIELDS = ['_id', 'listing_url', 'name', 'summary', 'property_type', 'room_type', 'bed_type',
+                  'minimum_nights', 'maximum_nights', 'cancellation_policy', 'last_scraped',
+                  'calendar_last_scraped', 'accommodates', 'bedrooms', 'beds', 'number_of_reviews', 'bathrooms',
+                  'price', 'security_deposit', 'cleaning_fee', 'extra_people', 'guests_included', 'weekly_price',
+                  'monthly_price', 'reviews_per_month']
+# Missing values the notebook fills with 0 and truncates to int
+ZERO_FILLED_FIELDS = ['bedrooms', 'beds', 'bathrooms', 'security_deposit', 'cleaning_fee', 'weekly_price',
+                      'monthly_price', 'reviews_per_month']
+DROPPED_HOST_FIELDS = {'host_thumbnail_url', 'host_picture_url', 'host_verifications'}
+AVAILABILITY_FIELDS = ['availability_30', 'availability_60', 'availability_90', 'availability_365']
+REVIEW_SCORE_FIELDS = ['review_scores_accuracy', 'review_scores_cleanliness', 'review_scores_checkin',
+                       'review_scores_communication', 'review_scores_location', 'review_scores_value',
+                       'review_scores_rating']
+
+# Prices above these are replaced with the mean price of private / shared rooms
+PRIVATE_ROOM_OUTLIER = 40000
+SHARED_ROOM_OUTLIER = 10000
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def iter_records(path, chunk_size=1 << 20):
+    """Yield the objects of a JSON array or JSON Lines file without reading it whole"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer, pos, eof = '', 0, False
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer, pos = f.read(chunk_size), 0
+                eof = not buffer
+                continue
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield record
+
+
+def _plain(value):
+    """Unwrap MongoDB extended JSON ($numberDecimal, $date, ...)"""
+    if isinstance(value, dict) and len(value) == 1:
+        (key, inner), = value.items()
+        if key in ('$numberDecimal', '$numberDouble'):
+            return float(inner)
+        if key in ('$numberInt', '$numberLong'):
+            return int(inner)
+        if key == '$date':
+            return _plain(inner)
+    return value
+
+
+def _date(value):
+    value = _plain(value)
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).date().isoformat()
+    return str(value)[:10]
+
+
+def _int_or_zero(value):
+    value = _plain(value)
+    return 0 if value is None else int(float(value))
+
+
+def flatten_record(record):
+    """One airbnb table row from one listing of the dump, cleaned like the notebook"""
+    row = {field: _plain(record.get(field)) for field in LISTING_FIELDS}
+    row['_id'] = str(row['_id'])
+    row['amenities'] = ', '.join(record.get('amenities') or [])
+    row['last_scraped'] = _date(record.get('last_scraped'))
+    row['calendar_last_scraped'] = _date(record.get('calendar_last_scraped'))
+    for field in ZERO_FILLED_FIELDS:
+        row[field] = _int_or_zero(row[field])
+
+    for field, value in (record.get('host') or {}).items():
+        if field not in DROPPED_HOST_FIELDS:
+            row[field] = _plain(value)
+    if row.get('host_response_time') is None:
+        row['host_response_time'] = 'Not Specified'
+    row['host_response_rate'] = _int_or_zero(row.get('host_response_rate'))
+
+    address = record.get('address') or {}
+    for field in ('street', 'suburb', 'government_area', 'market', 'country', 'country_code'):
+        row[field] = address.get(field)
+    location = address.get('location') or {}
+    row['location_type'] = location.get('type')
+    row['location_is_location_exact'] = location.get('is_location_exact')
+    coordinates = location.get('coordinates') or [None, None]
+    row['longitude'], row['latitude'] = _plain(coordinates[0]), _plain(coordinates[1])
+
+    availability = record.get('availability') or {}
+    for field in AVAILABILITY_FIELDS:
+        row[field] = _plain(availability.get(field))
+    review_scores = record.get('review_scores') or {}
+    for field in REVIEW_SCORE_FIELDS:
+        row[field] = _int_or_zero(review_scores.get(field))
+
+    # The dump stores some counts as strings or decimals ("2", 1.0)
+    for column in INTEGER_COLUMNS:
+        if row.get(column) is not None:
+            row[column] = int(float(row[column]))
+    return row
+
+
+def _copy_line(row, columns):
+    return '\t'.join('\\N' if row.get(column) is None else str(row[column]).translate(COPY_ESCAPES)
+                     for column in columns) + '\n'
+
+
+def create_table_sql(table='airbnb', if_not_exists=False):
+    columns = ', '.join(f'{column} {sql_type}' + (' PRIMARY KEY' if column == '_id' else '')
+                        for column, sql_type in COLUMN_TYPES.items())
+    return f"CREATE TABLE {'IF NOT EXISTS ' if if_not_exists else ''}{table} ({columns});"
+
+
+class PriceOutliers:
+    """Running room-type price means and the listings whose price must be replaced"""
+
+    def __init__(self):
+        self.sums = {'private room': 0.0, 'shared room': 0.0}
+        self.counts = {'private room': 0, 'shared room': 0}
+        self.private_room_ids = []
+        self.shared_room_ids = []
+
+    def add(self, row):
+        price = row.get('price')
+        if price is None:
+            return
+        # Matched exactly as stored, like the notebook's df1['room_type'] == 'private room'
+        room_type = row.get('room_type')
+        if room_type in self.sums:
+            self.sums[room_type] += price
+            self.counts[room_type] += 1
+        if price > PRIVATE_ROOM_OUTLIER:
+            self.private_room_ids.append(row['_id'])
+        elif price > SHARED_ROOM_OUTLIER:
+            self.shared_room_ids.append(row['_id'])
+
+    def mean(self, room_type):
+        return self.sums[room_type] / self.counts[room_type] if self.counts[room_type] else None
+
+    def apply(self, cursor, table='airbnb'):
+        for room_type, ids in (('private room', self.private_room_ids), ('shared room', self.shared_room_ids)):
+            if ids:
+                cursor.execute(f"UPDATE {table} SET price = %s WHERE _id = ANY(%s);",
+                               (self.mean(room_type), [int(_id) for _id in ids]))
+
+
+def copy_rows(cursor, records, table='airbnb', batch_size=5000, on_row=None):
+    """COPY flattened records into table in batches; returns the number of rows written"""
+    statement = f"COPY {table} ({', '.join(COLUMNS)}) FROM STDIN"
+    buffer, pending, total = io.StringIO(), 0, 0
+    for record in records:
+        row = flatten_record(record)
+        if on_row is not None:
+            on_row(row)
+        buffer.write(_copy_line(row, COLUMNS))
+        pending += 1
+        if pending == batch_size:
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            total += pending
+            buffer, pending = io.StringIO(), 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += pending
+    return total
+
+
+VERSIONS_TABLE_SQL = ("CREATE TABLE IF NOT EXISTS airbnb_versions (version SERIAL PRIMARY KEY, mode TEXT, "
+                      "changed_rows INTEGER, loaded_at TIMESTAMPTZ DEFAULT now());")
+CHANGES_TABLE_SQL = ("CREATE TABLE IF NOT EXISTS airbnb_changes (version INTEGER, _id INTEGER, "
+                     "PRIMARY KEY (version, _id));")
+
+
+# A unique index on _id alone, which ON CONFLICT (_id) needs; the table may not have been created by this module
+ID_UNIQUE_INDEX_QUERY = ("SELECT 1 FROM pg_index JOIN pg_attribute ON attrelid = indrelid AND attnum = indkey[0] "
+                         "WHERE indrelid = 'airbnb'::regclass AND indisunique AND indnatts = 1 AND attname = '_id';")
+
+
+def _ensure_unique_id(cursor):
+    cursor.execute(ID_UNIQUE_INDEX_QUERY)
+    if cursor.fetchone() is None:
+        cursor.execute("CREATE UNIQUE INDEX airbnb_id_idx ON airbnb (_id);")
+
+
+def _bump_version(cursor, mode, changed_rows):
+    """Record a load in airbnb_versions so caches keyed on it refresh"""
+    cursor.execute(VERSIONS_TABLE_SQL)
+    cursor.execute(CHANGES_TABLE_SQL)
+    cursor.execute("INSERT INTO airbnb_versions (mode, changed_rows) VALUES (%s, %s) RETURNING version;",
+                   (mode, changed_rows))
+    return cursor.fetchone()[0]
+
+
+def upsert_sql(version):
+    """Upsert the staged rows whose scrape dates moved and log their ids under version"""
+    columns = ', '.join(COLUMNS)
+    updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in COLUMNS if column != '_id')
+    return (f"WITH changed AS ("
+            f"INSERT INTO airbnb ({columns}) "
+            f"SELECT DISTINCT ON (_id) {columns} FROM airbnb_staging "
+            f"ORDER BY _id, last_scraped DESC NULLS LAST, calendar_last_scraped DESC NULLS LAST "
+            f"ON CONFLICT (_id) DO UPDATE SET {updates} "
+            f"WHERE airbnb.last_scraped IS DISTINCT FROM EXCLUDED.last_scraped "
+            f"OR airbnb.calendar_last_scraped IS DISTINCT FROM EXCLUDED.calendar_last_scraped "
+            f"RETURNING airbnb._id) "
+            f"INSERT INTO airbnb_changes (version, _id) SELECT {int(version)}, _id FROM changed;")
+
+
+def load_listings(path, engine, batch_size=5000, incremental=False):
+    """Load the listings of a JSON dump in one transaction.
+
+    By default the airbnb table is dropped and rebuilt. With incremental=True
+    the dump is staged in a temporary table and only listings that are new
+    or whose last_scraped / calendar_last_scraped changed are upserted, so
+    readers are not locked out by a full rewrite. Either way a new dataset
+    version is recorded and the summary rollups are refreshed. Returns
+    (listings read, listings written).
+    """
+    outliers = PriceOutliers()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        if incremental:
+            cursor.execute(create_table_sql(if_not_exists=True))
+            _ensure_unique_id(cursor)
+            cursor.execute("CREATE TEMP TABLE airbnb_staging (LIKE airbnb) ON COMMIT DROP;")
+            total = copy_rows(cursor, iter_records(path), table='airbnb_staging', batch_size=batch_size,
+                              on_row=outliers.add)
+            outliers.apply(cursor, table='airbnb_staging')
+            version = _bump_version(cursor, 'incremental', None)
+            cursor.execute(upsert_sql(version))
+            changed = cursor.rowcount
+            cursor.execute("UPDATE airbnb_versions SET changed_rows = %s WHERE version = %s;", (changed, version))
+        else:
+            cursor.execute("DROP TABLE IF EXISTS airbnb CASCADE;")
+            cursor.execute(create_table_sql())
+            total = changed = copy_rows(cursor, iter_records(path), batch_size=batch_size, on_row=outliers.add)
+            outliers.apply(cursor)
+            _bump_version(cursor, 'replace', changed)
+            # Every row was rewritten; older change logs no longer describe the table
+            cursor.execute("TRUNCATE airbnb_changes;")
+        for statement in LISTING_INDEXES:
+            cursor.execute(statement)
+        build_summaries(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return total, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load an airbnb JSON dump into Postgres")
+    parser.add_argument('path')
+    parser.add_argument('--url', default=DATABASE_URL)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--incremental', action='store_true',
+                        help="upsert new and re-scraped listings instead of rebuilding the table")
+    args = parser.parse_args()
+    total, changed = load_listings(args.path, get_engine(args.url), batch_size=args.batch_size,
+                                   incremental=args.incremental)
+    print(f"Loaded {total} listings, {changed} new or changed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from figure_cache import normalize_filters
+
+FACET_COLUMNS = ['property_type', 'room_type', 'price', 'number_of_reviews']
+RANGE_COLUMNS = ('price', 'number_of_reviews')
+# Source answers kept for filters the metadata cannot answer
+MAX_FALLBACKS = 1024
+
+
+def facet_table(df):
+    """Min and max price and review count per (property_type, room_type) of one country's rows"""
+    grouped = df.groupby(['property_type', 'room_type'], observed=True, dropna=False)
+    table = grouped.agg(price_min=('price', 'min'), price_max=('price', 'max'),
+                        number_of_reviews_min=('number_of_reviews', 'min'),
+                        number_of_reviews_max=('number_of_reviews', 'max'))
+    return table.reset_index()
+
+
+def _float(value):
+    return np.nan if pd.isna(value) else float(value)
+
+
+def _facets(table):
+    """Sidebar metadata of one country from its facet_table"""
+    property_types, room_types, ranges = set(), {}, {}
+    for row in table.itertuples(index=False):
+        if pd.notna(row.property_type):
+            property_types.add(row.property_type)
+            if pd.notna(row.room_type):
+                room_types.setdefault(row.property_type, set()).add(row.room_type)
+        ranges[(row.property_type, row.room_type)] = {
+            column: (_float(getattr(row, f'{column}_min')), _float(getattr(row, f'{column}_max')))
+            for column in RANGE_COLUMNS}
+    return {'property_types': sorted(property_types),
+            'room_types': {key: sorted(values) for key, values in room_types.items()},
+            'ranges': ranges}
+
+
+def _selected(filters, column):
+    values = filters[column]
+    return values if isinstance(values, (list, tuple)) else [values]
+
+
+class FacetService:
+    """Option lists and slider bounds for the sidebar, served from per-country metadata.
+
+    The first request for a country reduces it to one row per property type
+    and room type with their price and review ranges; later requests for that
+    country are lookups in that metadata, whatever the size of the table.
+    Everything is dropped when the source's data version changes. Filters the
+    metadata cannot answer, such as a narrowed price range, go to the source
+    once and are remembered until then.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._version = None
+        self._countries = None
+        # country -> metadata from _facets
+        self._facets = {}
+        self._fallbacks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _current(self):
+        version = self.source.data_version()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._countries = None
+                self._facets = {}
+                self._fallbacks = OrderedDict()
+
+    def country_facets(self, country):
+        self._current()
+        with self._lock:
+            facets = self._facets.get(country)
+        if facets is None:
+            facets = _facets(self.source.facet_table(country))
+            with self._lock:
+                self._facets[country] = facets
+        return facets
+
+    def _fallback(self, method, column, filters):
+        self._current()
+        key = (method, column, normalize_filters(filters))
+        with self._lock:
+            if key in self._fallbacks:
+                self._fallbacks.move_to_end(key)
+                return self._fallbacks[key]
+        value = getattr(self.source, method)(column, filters)
+        with self._lock:
+            self._fallbacks[key] = value
+            if len(self._fallbacks) > MAX_FALLBACKS:
+                self._fallbacks.popitem(last=False)
+        return value
+
+    def options(self, column, filters):
+        if column == 'country' and not filters:
+            self._current()
+            if self._countries is None:
+                self._countries = self.source.options('country', {})
+            return self._countries
+        if set(filters) == {'country'} and column == 'property_type':
+            return self.country_facets(filters['country'])['property_types']
+        if set(filters) == {'country', 'property_type'} and column == 'room_type':
+            room_types = self.country_facets(filters['country'])['room_types']
+            return sorted({room_type for property_type in _selected(filters, 'property_type')
+                           for room_type in room_types.get(property_type, [])})
+        return self._fallback('options', column, filters)
+
+    def value_range(self, column, filters):
+        selected = set(filters)
+        if column not in RANGE_COLUMNS or selected not in ({'country'}, {'country', 'property_type', 'room_type'}):
+            return self._fallback('value_range', column, filters)
+        ranges = self.country_facets(filters['country'])['ranges']
+        if selected == {'country'}:
+            bounds = [cell[column] for cell in ranges.values()]
+        else:
+            keys = itertools.product(_selected(filters, 'property_type'), _selected(filters, 'room_type'))
+            bounds = [ranges[key][column] for key in keys if key in ranges]
+        lows = [low for low, _ in bounds if not np.isnan(low)]
+        highs = [high for _, high in bounds if not np.isnan(high)]
+        return (min(lows) if lows else np.nan), (max(highs) if highs else np.nan)
@@ -0,0 +1,60 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+from queries import RANGE_FILTERS
+
+
+def normalize_filters(filters):
+    """Hashable, order-independent form of a page's filters dict"""
+    items = []
+    for column, value in sorted(filters.items()):
+        if isinstance(value, (list, tuple)):
+            value = tuple(value) if column in RANGE_FILTERS else tuple(sorted(value))
+        items.append((column, value))
+    return tuple(items)
+
+
+def estimate_size(value):
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class FigureCache:
+    """Least-recently-used cache of figures and aggregates bounded by their pickled size"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries or size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.total_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
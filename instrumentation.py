@@ -0,0 +1,90 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+def payload_bytes(value):
+    """Size of the JSON a chart sends to the browser, None for anything else"""
+    to_json = getattr(value, 'to_json', None)
+    if to_json is None or isinstance(value, (pd.DataFrame, pd.Series)):
+        return None
+    return len(to_json().encode())
+
+
+class StepTimer:
+    """Wall time, peak traced memory and payload size of named steps.
+
+    Steps may nest and may run on several threads at once, as they do when a
+    page gathers queries on the query pool. Peak memory needs tracemalloc,
+    which slows allocation-heavy code down, so it is only measured with
+    trace_memory=True (the benchmark), not in the app. tracemalloc tracks the
+    whole process, so a step's peak includes what overlapping steps allocate.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        # id of each open step's record -> highest traced memory seen while it was open
+        self._peaks = {}
+        self._lock = threading.Lock()
+
+    def _fold_peak(self):
+        """Credit the peak since the last reset to every open step and start a new interval; needs _lock"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for key, value in self._peaks.items():
+            self._peaks[key] = max(value, peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def step(self, name, **fields):
+        record = {'step': name, **fields}
+        if self.trace_memory:
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                self._fold_peak()
+                current = self._peaks[id(record)] = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            with self._lock:
+                if self.trace_memory:
+                    self._fold_peak()
+                    record['peak_bytes'] = self._peaks.pop(id(record)) - current
+                self.records.append(record)
+
+    def call(self, name, function, *args, **kwargs):
+        """Run function as a step; charts also record their payload size"""
+        with self.step(name) as record:
+            value = function(*args, **kwargs)
+            size = payload_bytes(value)
+            if size is not None:
+                record['payload_bytes'] = size
+        return value
+
+    def frame(self):
+        with self._lock:
+            return pd.DataFrame(self.records)
+
+
+class TimedProxy:
+    """Forwards to a data source, timing every method call as '<prefix>.<method>'"""
+
+    def __init__(self, target, timer, prefix):
+        self._target = target
+        self._timer = timer
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value):
+            return value
+
+        def timed(*args, **kwargs):
+            return self._timer.call(f'{self._prefix}.{name}', value, *args, **kwargs)
+        return timed
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from facets import FACET_COLUMNS, facet_table
+from partition_index import CountryPartitionIndex, partition_order
+from queries import MAP_COLUMNS, fetch_version
+from schema import CATEGORY_COLUMNS, column_bytes, compact_frame, memory_report
+from search_index import InvertedIndex
+from spatial_index import TileIndex
+
+# Frames handed out by the store are shallow copies; with copy-on-write a page
+# that filters or assigns into its copy can never write back into the shared one.
+# pandas 3 always behaves this way and deprecates the option.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+LOAD_QUERY = text("SELECT * FROM airbnb;")
+FULL_LOADS_SINCE_QUERY = text("SELECT COUNT(*) FROM airbnb_versions "
+                              "WHERE version > :since AND mode <> 'incremental';")
+CHANGED_ROWS_QUERY = text("SELECT * FROM airbnb WHERE _id IN "
+                          "(SELECT _id FROM airbnb_changes WHERE version > :since);")
+
+logger = logging.getLogger(__name__)
+
+
+class ListingStore:
+    """Single in-memory copy of the airbnb table shared by every session and rerun"""
+
+    def __init__(self, engine, ttl=300):
+        self.engine = engine
+        self.ttl = ttl
+        self.version = None
+        # Bytes per column of the cached frame against the table as read_sql returns it
+        self.memory_report = None
+        # Bytes per row of each column as read at the last full load, to estimate the report after merges
+        self._raw_row_bytes = None
+        # (frame, partition index) swapped together so readers never see a mixed pair
+        self._data = None
+        # name -> (frame it was built from, index), built on first use
+        self._indexes = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def read_table(self):
+        with self.engine.connect() as conn:
+            return pd.read_sql_query(LOAD_QUERY, conn)
+
+    def current_version(self):
+        return fetch_version(self.engine)
+
+    def load(self):
+        """Pull the whole table once, compact it and lay it out by country and price"""
+        raw = self.read_table()
+        df = compact_frame(raw)
+        raw_bytes = column_bytes(raw)
+        self._raw_row_bytes = raw_bytes / max(len(raw), 1)
+        self._report_memory(raw_bytes, df)
+        df = df.take(partition_order(df)).reset_index(drop=True)
+        return df, CountryPartitionIndex(df)
+
+    def load_changes(self, since):
+        """Merge the rows upserted by incremental loads after load version `since` into the cached frame.
+
+        Returns None when a full reload happened in between and the change log
+        does not cover it.
+        """
+        with self.engine.connect() as conn:
+            if conn.execute(FULL_LOADS_SINCE_QUERY, {'since': since}).scalar():
+                return None
+            changed = compact_frame(pd.read_sql_query(CHANGED_ROWS_QUERY, conn, params={'since': since}))
+        df = self._data[0]
+        df = pd.concat([df[~df['_id'].isin(changed['_id'])], changed], ignore_index=True)
+        # Categories of the two parts differ, so concat falls back to plain values
+        df = df.assign(**{column: df[column].astype('category') for column in CATEGORY_COLUMNS
+                          if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype)})
+        df = df.take(partition_order(df)).reset_index(drop=True)
+        # The merged rows were never held as read, so the before side is scaled from the last full load
+        self._report_memory(self._raw_row_bytes * len(df), df)
+        return df, CountryPartitionIndex(df)
+
+    def _report_memory(self, before, df):
+        self.memory_report = memory_report(before, df)
+        total = self.memory_report.loc['total']
+        logger.info("Cached airbnb table: %d rows, %.1f MB, %.1fx smaller than as read",
+                    len(df), total['after_bytes'] / 2 ** 20, total['ratio'])
+
+    def refresh(self, force=False):
+        """Reload when the version key moved; the key is checked at most once per ttl seconds"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._data is not None and now - self._checked_at < self.ttl:
+                return
+            version = self.current_version()
+            if force or self._data is None or version != self.version:
+                data = None
+                # Only a new load version has its rows in the change log; any other move is a full reload
+                if (not force and self._data is not None and None not in (self.version[2], version[2])
+                        and version[2] > self.version[2]):
+                    data = self.load_changes(self.version[2])
+                self._data = data if data is not None else self.load()
+                self.version = version
+            self._checked_at = now
+
+    def data_version(self):
+        self.refresh()
+        return self.version
+
+    @property
+    def frame(self):
+        """Read-only view of the cached table"""
+        self.refresh()
+        return self._data[0].copy(deep=False)
+
+    def select(self, filters, columns=None):
+        """Rows matching the filters, found through the partition index"""
+        self.refresh()
+        df, index = self._data
+        if columns is not None:
+            df = df[columns]
+        return df.take(index.positions(filters))
+
+    def rows(self, columns, filters):
+        df = self.select(filters, columns)
+        # Charts and value_counts should only see the categories left after filtering
+        categories = [column for column in columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+        if categories:
+            df = df.assign(**{column: df[column].cat.remove_unused_categories() for column in categories})
+        return df
+
+    def options(self, column, filters):
+        if column == 'country' and not filters:
+            self.refresh()
+            return list(self._data[1].slices)
+        return sorted(self.select(filters, [column])[column].dropna().unique())
+
+    def value_range(self, column, filters):
+        values = self.select(filters, [column])[column]
+        return values.min(), values.max()
+
+    def facet_table(self, country):
+        return facet_table(self.select({'country': country}, FACET_COLUMNS))
+
+    def derived_index(self, name, build):
+        """Frame and an index built from it on first use, rebuilt after a reload.
+
+        The build runs outside the lock, so pages keep reading the cached
+        table while a cold index is built.
+        """
+        self.refresh()
+        df = self._data[0]
+        with self._lock:
+            built = self._indexes.get(name)
+        if built is None or built[0] is not df:
+            built = (df, build(df))
+            with self._lock:
+                # A reload during the build leaves this index to the old frame's readers
+                if self._data[0] is df:
+                    self._indexes[name] = built
+        return built
+
+    def search(self, query, limit=None):
+        """Listings matching every term of the query by token prefix, best match first"""
+        df, index = self.derived_index('search', InvertedIndex)
+        return df.take(index.search(query, limit))
+
+    def map_view(self, bbox, zoom, budget):
+        """Listings inside (south, west, north, east), or their tile clusters if more than budget"""
+        df, index = self.derived_index('tiles', TileIndex)
+        positions = index.points_in(*bbox)
+        if len(positions) <= budget:
+            return df[MAP_COLUMNS].take(positions)
+        return index.clusters_in(*bbox, zoom)
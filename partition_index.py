@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+def partition_order(df):
+    """Row order that makes every country a contiguous, price-sorted slice"""
+    country_codes = df['country'].cat.codes.to_numpy()
+    price = df['price'].to_numpy(dtype='float64')
+    return np.lexsort((price, country_codes))
+
+
+class CountryPartitionIndex:
+    """Row positions of a frame sorted with partition_order, grouped by country.
+
+    A page filter becomes a slice lookup for the country, two searchsorted cuts
+    for the price range and code comparisons inside that slice for the rest,
+    so no step scans the rows of other countries.
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.price = df['price'].to_numpy(dtype='float64')
+        self.reviews = df['number_of_reviews'].to_numpy(dtype='float64', na_value=np.nan)
+        self.codes = {column: df[column].cat.codes.to_numpy() for column in ('property_type', 'room_type')}
+        self.categories = {column: df[column].cat.categories for column in ('country', 'property_type', 'room_type')}
+
+        country_codes = df['country'].cat.codes.to_numpy()
+        starts = np.flatnonzero(np.diff(country_codes, prepend=-2))
+        stops = np.append(starts[1:], len(df))
+        self.slices = {self.categories['country'][country_codes[start]]: (start, stop)
+                       for start, stop in zip(starts, stops) if country_codes[start] >= 0}
+
+    def country_slice(self, country):
+        if country is None:
+            return 0, self.size
+        return self.slices.get(country, (0, 0))
+
+    def positions(self, filters):
+        """Row positions matching the same filters dict queries.where_clause accepts"""
+        country = filters.get('country')
+        start, stop = self.country_slice(country)
+        mask = None
+        if 'price' in filters:
+            low, high = filters['price']
+            prices = self.price[start:stop]
+            if country is None:
+                # Prices are only sorted within a country
+                mask = (prices >= low) & (prices <= high)
+            else:
+                start, stop = (start + np.searchsorted(prices, low, side='left'),
+                               start + np.searchsorted(prices, high, side='right'))
+
+        for column in ('property_type', 'room_type'):
+            if column not in filters:
+                continue
+            values = filters[column]
+            values = values if isinstance(values, (list, tuple)) else [values]
+            wanted = self.categories[column].get_indexer(pd.Index(values))
+            column_mask = np.isin(self.codes[column][start:stop], wanted[wanted >= 0])
+            mask = column_mask if mask is None else mask & column_mask
+        if 'number_of_reviews' in filters:
+            low, high = filters['number_of_reviews']
+            reviews = self.reviews[start:stop]
+            column_mask = (reviews >= low) & (reviews <= high)
+            mask = column_mask if mask is None else mask & column_mask
+
+        if mask is None:
+            return np.arange(start, stop)
+        return start + np.flatnonzero(mask)
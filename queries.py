@@ -0,0 +1,194 @@
+import time
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from data_access import gather, statement
+from schema import compact_frame
+from search_index import SEARCH_COLUMNS, tokenize
+from spatial_index import cluster_zoom
+
+# Columns each page actually reads; everything else (summary, host_about,
+# amenities, ...) stays in the database.
+EXPLORATION_COLUMNS = ['_id', 'name', 'price', 'number_of_reviews', 'review_scores_rating']
+ANALYSIS_COLUMNS = ['name', 'property_type', 'room_type', 'price', 'number_of_reviews',
+                    'review_scores_rating', 'cancellation_policy', 'availability_30', 'availability_60',
+                    'availability_90', 'availability_365']
+MAP_COLUMNS = ['latitude', 'longitude', 'price', 'name', 'number_of_reviews', 'review_scores_rating']
+
+VERSION_QUERY = text("SELECT COUNT(*), MAX(last_scraped) FROM airbnb;")
+# Bumped by every etl.load_listings run
+LOAD_VERSION_QUERY = text("SELECT MAX(version) FROM airbnb_versions;")
+
+CATEGORY_FILTERS = ('country', 'property_type', 'room_type')
+RANGE_FILTERS = ('price', 'number_of_reviews')
+
+# Document the full-text search matches against; the GIN index below is built on
+# exactly this expression so the planner can use it.
+SEARCH_DOCUMENT = "to_tsvector('simple', {})".format(
+    " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS))
+
+# Matching indexes for the WHERE clauses below, created after the table is loaded
+LISTING_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS airbnb_country_price_idx ON airbnb (country, price);",
+    "CREATE INDEX IF NOT EXISTS airbnb_country_type_idx ON airbnb (country, property_type, room_type);",
+    "CREATE INDEX IF NOT EXISTS airbnb_country_reviews_idx ON airbnb (country, number_of_reviews);",
+    "CREATE INDEX IF NOT EXISTS airbnb_location_idx ON airbnb (latitude, longitude);",
+    f"CREATE INDEX IF NOT EXISTS airbnb_search_idx ON airbnb USING GIN (({SEARCH_DOCUMENT}));",
+]
+
+
+def fetch_version(engine):
+    """Cheap version key of the table: row count, latest scrape date and ETL load version"""
+    with engine.connect() as conn:
+        count, last_scraped = conn.execute(VERSION_QUERY).one()
+        load_version = None
+        if inspect(conn).has_table('airbnb_versions'):
+            load_version = conn.execute(LOAD_VERSION_QUERY).scalar()
+    return (int(count), str(last_scraped), load_version)
+
+
+def where_clause(filters):
+    """Turn the sidebar selections into a parameterized WHERE clause.
+
+    Category filters take a single value or a list of values, range filters
+    take an inclusive (min, max) pair.
+    """
+    clauses, params = [], {}
+    for column, value in filters.items():
+        if column in RANGE_FILTERS:
+            clauses.append(f"{column} BETWEEN :{column}_min AND :{column}_max")
+            params[f'{column}_min'], params[f'{column}_max'] = value
+        elif column in CATEGORY_FILTERS:
+            if isinstance(value, (list, tuple)):
+                clauses.append(f"{column} = ANY(:{column})")
+                params[column] = list(value)
+            else:
+                clauses.append(f"{column} = :{column}")
+                params[column] = value
+        else:
+            raise ValueError(f"Unsupported filter column: {column}")
+    sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return sql, params
+
+
+def select_listings(columns, filters):
+    where, params = where_clause(filters)
+    return statement(f"SELECT {', '.join(columns)} FROM airbnb{where};"), params
+
+
+def select_options(column, filters):
+    where, params = where_clause(filters)
+    where = f"{where} AND {column} IS NOT NULL" if where else f" WHERE {column} IS NOT NULL"
+    return statement(f"SELECT DISTINCT {column} FROM airbnb{where} ORDER BY {column};"), params
+
+
+def select_range(column, filters):
+    where, params = where_clause(filters)
+    return statement(f"SELECT MIN({column}), MAX({column}) FROM airbnb{where};"), params
+
+
+def select_facets(country):
+    """Price and review count range per property type and room type of one country"""
+    return statement("SELECT property_type, room_type, MIN(price) AS price_min, MAX(price) AS price_max, "
+                     "MIN(number_of_reviews) AS number_of_reviews_min, "
+                     "MAX(number_of_reviews) AS number_of_reviews_max "
+                     "FROM airbnb WHERE country = :country GROUP BY property_type, room_type;"), {'country': country}
+
+
+def select_viewport(bbox, columns=None, tile_size=None):
+    """Listings inside (south, west, north, east): their count, the rows, or one cluster per tile"""
+    south, west, north, east = bbox
+    params = {'south': south, 'west': west, 'north': north, 'east': east}
+    where = " WHERE latitude BETWEEN :south AND :north AND longitude BETWEEN :west AND :east"
+    if tile_size is not None:
+        params['tile_height'], params['tile_width'] = tile_size
+        return statement("SELECT AVG(latitude) AS latitude, AVG(longitude) AS longitude, "
+                         f"ROUND(AVG(price), 2) AS price, COUNT(*) AS count FROM airbnb{where} "
+                         "GROUP BY FLOOR((latitude + 90) / :tile_height), "
+                         "FLOOR((longitude + 180) / :tile_width);"), params
+    if columns is None:
+        return statement(f"SELECT COUNT(*) FROM airbnb{where};"), params
+    return statement(f"SELECT {', '.join(columns)} FROM airbnb{where};"), params
+
+
+def search_listings(query, limit=None):
+    """Prefix match on every query term, ranked by ts_rank"""
+    terms = tokenize(query)
+    params = {'query': ' & '.join(f'{term}:*' for term in terms)}
+    sql = (f"SELECT * FROM airbnb WHERE {SEARCH_DOCUMENT} @@ to_tsquery('simple', :query) "
+           f"ORDER BY ts_rank({SEARCH_DOCUMENT}, to_tsquery('simple', :query)) DESC")
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params['limit'] = limit
+    return statement(sql + ";"), params
+
+
+class SqlListingSource:
+    """Answers the page queries in Postgres, moving only the projected, filtered rows"""
+
+    def __init__(self, engine, ttl=300):
+        self.engine = engine
+        self.ttl = ttl
+        self._version = None
+        self._checked_at = 0.0
+
+    def data_version(self):
+        """Version key of the table, checked at most once per ttl seconds"""
+        now = time.monotonic()
+        if self._version is None or now - self._checked_at >= self.ttl:
+            self._version = fetch_version(self.engine)
+            self._checked_at = now
+        return self._version
+
+    def rows(self, columns, filters):
+        query, params = select_listings(columns, filters)
+        with self.engine.connect() as conn:
+            return compact_frame(pd.read_sql_query(query, conn, params=params))
+
+    def options(self, column, filters):
+        query, params = select_options(column, filters)
+        with self.engine.connect() as conn:
+            return [value for (value,) in conn.execute(query, params)]
+
+    def value_range(self, column, filters):
+        query, params = select_range(column, filters)
+        with self.engine.connect() as conn:
+            low, high = conn.execute(query, params).one()
+        return low, high
+
+    def facet_table(self, country):
+        query, params = select_facets(country)
+        with self.engine.connect() as conn:
+            return pd.read_sql_query(query, conn, params=params, coerce_float=True)
+
+    def search(self, query, limit=None):
+        if not tokenize(query):
+            return pd.DataFrame()
+        query, params = search_listings(query, limit)
+        with self.engine.connect() as conn:
+            return compact_frame(pd.read_sql_query(query, conn, params=params))
+
+    def viewport_count(self, bbox):
+        query, params = select_viewport(bbox)
+        with self.engine.connect() as conn:
+            return conn.execute(query, params).scalar()
+
+    def viewport_clusters(self, bbox, zoom):
+        level = cluster_zoom(zoom)
+        tile_size = (180.0 / 2 ** level, 360.0 / 2 ** level)
+        query, params = select_viewport(bbox, tile_size=tile_size)
+        with self.engine.connect() as conn:
+            clusters = pd.read_sql_query(query, conn, params=params, coerce_float=True)
+        clusters.attrs['cell_size'] = tile_size
+        return clusters
+
+    def map_view(self, bbox, zoom, budget):
+        # Count and clusters run side by side; most zoomed-out views need the clusters anyway
+        count, clusters = gather(lambda: self.viewport_count(bbox),
+                                 lambda: self.viewport_clusters(bbox, zoom))
+        if count > budget:
+            return clusters
+        query, params = select_viewport(bbox, MAP_COLUMNS)
+        with self.engine.connect() as conn:
+            return compact_frame(pd.read_sql_query(query, conn, params=params))
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    TEXT_DTYPE = None
+
+# Postgres type of every airbnb column, as created in data_preprocessing.ipynb
+COLUMN_TYPES = {
+    '_id': 'SERIAL', 'listing_url': 'TEXT', 'name': 'TEXT', 'summary': 'TEXT', 'property_type': 'TEXT',
+    'room_type': 'TEXT', 'bed_type': 'TEXT', 'minimum_nights': 'INTEGER', 'maximum_nights': 'INTEGER',
+    'cancellation_policy': 'TEXT', 'last_scraped': 'DATE', 'calendar_last_scraped': 'DATE',
+    'accommodates': 'INTEGER', 'bedrooms': 'INTEGER', 'beds': 'INTEGER', 'number_of_reviews': 'INTEGER',
+    'bathrooms': 'REAL', 'price': 'NUMERIC', 'security_deposit': 'NUMERIC', 'cleaning_fee': 'NUMERIC',
+    'extra_people': 'NUMERIC', 'guests_included': 'INTEGER', 'weekly_price': 'NUMERIC',
+    'monthly_price': 'NUMERIC', 'reviews_per_month': 'REAL', 'host_id': 'TEXT', 'amenities': 'TEXT',
+    'host_url': 'TEXT', 'host_name': 'TEXT', 'host_location': 'TEXT', 'host_about': 'TEXT',
+    'host_response_time': 'TEXT', 'host_neighbourhood': 'TEXT', 'host_response_rate': 'INTEGER',
+    'host_is_superhost': 'BOOLEAN', 'host_has_profile_pic': 'BOOLEAN', 'host_identity_verified': 'BOOLEAN',
+    'host_listings_count': 'INTEGER', 'host_total_listings_count': 'INTEGER', 'street': 'TEXT',
+    'suburb': 'TEXT', 'government_area': 'TEXT', 'market': 'TEXT', 'country': 'TEXT', 'country_code': 'TEXT',
+    'location_type': 'TEXT', 'latitude': 'NUMERIC', 'longitude': 'NUMERIC',
+    'location_is_location_exact': 'BOOLEAN', 'availability_30': 'INTEGER', 'availability_60': 'INTEGER',
+    'availability_90': 'INTEGER', 'availability_365': 'INTEGER', 'review_scores_accuracy': 'INTEGER',
+    'review_scores_cleanliness': 'INTEGER', 'review_scores_checkin': 'INTEGER',
+    'review_scores_communication': 'INTEGER', 'review_scores_location': 'INTEGER',
+    'review_scores_value': 'INTEGER', 'review_scores_rating': 'INTEGER',
+}
+
+# Low-cardinality TEXT columns kept as pandas categories
+CATEGORY_COLUMNS = ('property_type', 'room_type', 'bed_type', 'cancellation_policy', 'host_response_time',
+                    'government_area', 'market', 'country', 'country_code', 'location_type')
+
+# NUMERIC columns that need full precision; the other money columns fit in float32
+FLOAT64_COLUMNS = ('price', 'latitude', 'longitude')
+
+
+def _smallest_int(series):
+    values = pd.to_numeric(series.dropna(), downcast='integer')
+    dtype = values.dtype if len(values) else np.dtype('int8')
+    if len(values) < len(series):
+        # Keep NULLs without falling back to float: Int8/Int16/... are nullable
+        return series.astype(dtype.name.capitalize())
+    return series.astype(dtype)
+
+
+def _bool(series):
+    return series.astype('boolean') if series.isna().any() else series.astype(bool)
+
+
+def compact_frame(df):
+    """Cast a frame read from the airbnb table to the smallest dtypes its schema allows"""
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        sql_type = COLUMN_TYPES.get(column)
+        if column in CATEGORY_COLUMNS:
+            columns[column] = series.astype('category')
+        elif sql_type == 'NUMERIC':
+            dtype = 'float64' if column in FLOAT64_COLUMNS else 'float32'
+            columns[column] = pd.to_numeric(series, errors='coerce').astype(dtype)
+        elif sql_type == 'REAL':
+            columns[column] = pd.to_numeric(series, errors='coerce').astype('float32')
+        elif sql_type == 'INTEGER':
+            columns[column] = _smallest_int(pd.to_numeric(series, errors='coerce'))
+        elif sql_type == 'BOOLEAN':
+            columns[column] = _bool(series)
+        elif sql_type == 'DATE':
+            columns[column] = pd.to_datetime(series, errors='coerce')
+        elif sql_type == 'TEXT' and TEXT_DTYPE is not None:
+            columns[column] = series.astype(TEXT_DTYPE)
+        else:
+            columns[column] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def column_bytes(df):
+    """Bytes per column of a frame, counting the Python objects it holds"""
+    return df.memory_usage(index=False, deep=True)
+
+
+def memory_report(before, after):
+    """Bytes per column before and after compact_frame, largest savings first.
+
+    Either side may be a frame or its column_bytes.
+    """
+    report = pd.DataFrame({
+        'before_bytes': before if isinstance(before, pd.Series) else column_bytes(before),
+        'after_bytes': after if isinstance(after, pd.Series) else column_bytes(after),
+    })
+    report['ratio'] = report['before_bytes'] / report['after_bytes']
+    report.loc['total'] = report[['before_bytes', 'after_bytes']].sum().tolist() + [
+        report['before_bytes'].sum() / report['after_bytes'].sum()]
+    return report.sort_values('before_bytes', ascending=False)
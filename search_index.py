@@ -0,0 +1,98 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Free-text and descriptive columns a search term is matched against
+SEARCH_COLUMNS = ('name', 'summary', 'amenities', 'street', 'suburb', 'government_area', 'market', 'country',
+                  'property_type', 'room_type', 'host_name', 'host_location', 'host_about', 'host_neighbourhood')
+
+TOKEN_PATTERN = r'\w+'
+
+
+def tokenize(text):
+    return re.findall(TOKEN_PATTERN, text.casefold())
+
+
+def _column_tokens(values):
+    """(row position, token id) pairs of one column and its token vocabulary.
+
+    Listings repeat the same market, suburb, host or property type many
+    times, so each distinct value is tokenized once and its token ids are
+    handed to every row holding it; only integer pairs are kept per row.
+    """
+    text_codes, texts = pd.factorize(values)
+    tokens = (pd.Series(np.asarray(texts, dtype=object)).astype(str).str.casefold()
+              .str.findall(TOKEN_PATTERN).explode().dropna())
+    token_ids, vocabulary = pd.factorize(tokens.to_numpy(dtype=object))
+    # Tokens of text t are token_ids[starts[t]:starts[t] + per_text[t]]
+    per_text = np.bincount(tokens.index.to_numpy(dtype=np.int64), minlength=len(texts))
+    starts = np.cumsum(per_text) - per_text
+
+    rows = np.flatnonzero(text_codes >= 0).astype(np.int32)
+    counts = per_text[text_codes[rows]]
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(starts[text_codes[rows]], counts) + within
+    return np.repeat(rows, counts), token_ids[positions].astype(np.int32), np.asarray(vocabulary, dtype=object)
+
+
+class InvertedIndex:
+    """Token -> row positions index over the text columns of a frame.
+
+    Postings are stored flat: the rows and tf-idf weights of vocabulary[i]
+    live in rows[offsets[i]:offsets[i + 1]]. The vocabulary is sorted, so
+    every token starting with a prefix is one contiguous range of it.
+    """
+
+    def __init__(self, df, columns=SEARCH_COLUMNS):
+        self.size = len(df)
+        row_parts, token_parts, vocabularies = [], [], []
+        offset = 0
+        for column in columns:
+            if column not in df.columns:
+                continue
+            rows, tokens, vocabulary = _column_tokens(df[column])
+            row_parts.append(rows)
+            token_parts.append(tokens + offset)
+            vocabularies.append(vocabulary)
+            offset += len(vocabulary)
+        rows = np.concatenate(row_parts) if row_parts else np.array([], dtype=np.int32)
+        # Merge the per-column vocabularies; a token shared by two columns gets one id
+        global_ids, vocabulary = pd.factorize(np.concatenate(vocabularies) if vocabularies
+                                              else np.array([], dtype=object))
+        codes = global_ids[np.concatenate(token_parts)] if token_parts else np.array([], dtype=np.int64)
+
+        # Work on integer token ids: sort the distinct tokens once, then every
+        # (token, row) pair is a single int64 key
+        order = np.argsort(vocabulary.astype(object))
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.vocabulary = np.asarray(vocabulary, dtype=object)[order]
+        keys, term_counts = np.unique(rank[codes].astype(np.int64) * max(self.size, 1) + rows, return_counts=True)
+        token_ids = keys // max(self.size, 1)
+        self.rows = keys % max(self.size, 1)
+        document_counts = np.bincount(token_ids, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate(([0], np.cumsum(document_counts)))
+        idf = np.log1p(self.size / np.maximum(document_counts, 1))
+        self.weights = (term_counts * idf[token_ids]).astype(np.float32)
+
+    def _prefix_postings(self, prefix):
+        low = np.searchsorted(self.vocabulary, prefix, side='left')
+        high = np.searchsorted(self.vocabulary, prefix + '\U0010ffff', side='left')
+        start, stop = self.offsets[low], self.offsets[high]
+        return self.rows[start:stop], self.weights[start:stop]
+
+    def search(self, query, limit=None):
+        """Row positions containing a token starting with every query term, best match first"""
+        terms = tokenize(query)
+        if not terms or not self.size:
+            return np.array([], dtype=np.int64)
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = np.ones(self.size, dtype=bool)
+        for term in terms:
+            rows, weights = self._prefix_postings(term)
+            scores += np.bincount(rows, weights=weights, minlength=self.size).astype(np.float32)
+            matched &= np.bincount(rows, minlength=self.size) > 0
+        positions = np.flatnonzero(matched)
+        positions = positions[np.argsort(-scores[positions], kind='stable')]
+        return positions if limit is None else positions[:limit]
@@ -0,0 +1,79 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Listing attributes two similar listings should share; heavy-tailed counts are log-scaled first
+FEATURE_COLUMNS = ['price', 'review_scores_rating', 'number_of_reviews', 'accommodates', 'bedrooms', 'beds',
+                   'bathrooms', 'latitude', 'longitude']
+LOG_COLUMNS = ('price', 'number_of_reviews')
+DETAIL_COLUMNS = ['_id', 'name', 'property_type', 'room_type'] + FEATURE_COLUMNS
+
+
+class SimilarityIndex:
+    """Nearest-neighbour index over the listings of one country.
+
+    Every feature is log-scaled where skewed, missing values take the
+    column median, and columns are standardized so no unit dominates the
+    distance. A query is one matrix-vector product over the country plus an
+    argpartition, which stays in the milliseconds for the largest markets.
+    """
+
+    def __init__(self, df):
+        self.frame = df.reset_index(drop=True)
+        # _id -> row position
+        self.ids = pd.Index(self.frame['_id'].to_numpy())
+        features = pd.DataFrame({column: self.frame[column].to_numpy(dtype='float64', na_value=np.nan)
+                                 for column in FEATURE_COLUMNS})
+        features[list(LOG_COLUMNS)] = np.log1p(features[list(LOG_COLUMNS)].clip(lower=0))
+        features = features.fillna(features.median()).fillna(0.0)
+        features = (features - features.mean()) / features.std(ddof=0).replace(0.0, 1.0)
+        self.matrix = features.to_numpy(dtype=np.float32)
+        self.squared_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def position(self, listing_id):
+        """Row position of a listing, or None if it is not in this country"""
+        position = self.ids.get_indexer([listing_id])[0]
+        return None if position < 0 else position
+
+    def neighbors(self, listing_id, k=5):
+        """Up to k other listings closest to listing_id, nearest first, with their distance"""
+        position = self.position(listing_id)
+        if position is None:
+            return self.frame.iloc[:0].assign(distance=np.float32())
+        query = self.matrix[position]
+        distances = self.squared_norms - 2 * (self.matrix @ query) + self.squared_norms[position]
+        distances[position] = np.inf
+        k = min(k, len(distances) - 1)
+        if k <= 0:
+            return self.frame.iloc[:0].assign(distance=np.float32())
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return self.frame.take(nearest).assign(distance=np.sqrt(np.maximum(distances[nearest], 0)))
+
+
+class SimilarListings:
+    """Per-country similarity indexes built on first use and dropped when the data version changes"""
+
+    def __init__(self, source):
+        self.source = source
+        self._version = None
+        # country -> SimilarityIndex
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, country):
+        version = self.source.data_version()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._indexes = {}
+            index = self._indexes.get(country)
+        if index is None:
+            index = SimilarityIndex(self.source.rows(DETAIL_COLUMNS, {'country': country}))
+            with self._lock:
+                self._indexes[country] = index
+        return index
+
+    def similar(self, country, listing_id, k=5):
+        return self.index(country).neighbors(listing_id, k)
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+# Finest grid: 2**16 x 2**16 equal-angle tiles over the globe
+MAX_ZOOM = 16
+# Zoom levels with precomputed per-tile clusters
+CLUSTER_ZOOMS = (2, 4, 6, 8, 10, 12, 14)
+
+
+def _spread_bits(values):
+    """Insert a zero bit between each of the low 16 bits"""
+    values = values.astype(np.uint64) & np.uint64(0xFFFF)
+    for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def tile_keys(latitude, longitude):
+    """Z-order key of the finest tile holding each point.
+
+    Sorting by this key puts every tile of every coarser zoom level in one
+    contiguous run, so a tile lookup is two searchsorted calls.
+    """
+    scale = 2 ** MAX_ZOOM
+    column = np.clip(((np.asarray(longitude) + 180.0) / 360.0 * scale).astype(np.int64), 0, scale - 1)
+    row = np.clip(((np.asarray(latitude) + 90.0) / 180.0 * scale).astype(np.int64), 0, scale - 1)
+    return _spread_bits(column) | (_spread_bits(row) << np.uint64(1))
+
+
+def cluster_zoom(zoom):
+    """Cluster level for a map zoom: about 8x8 clusters per map tile"""
+    return max([level for level in CLUSTER_ZOOMS if level <= zoom + 3] or [CLUSTER_ZOOMS[0]])
+
+
+def viewport(latitude, longitude, zoom):
+    """(south, west, north, east) of a map centred on a point, about four tiles wide"""
+    width = min(4 * 360.0 / 2 ** zoom, 360.0)
+    height = min(width / 2, 180.0)
+    return (max(latitude - height / 2, -90.0), max(longitude - width / 2, -180.0),
+            min(latitude + height / 2, 90.0), min(longitude + width / 2, 180.0))
+
+
+class TileIndex:
+    """Z-ordered tile index over listing coordinates with per-tile clusters.
+
+    Points inside a bounding box are found by covering it with a handful of
+    tiles and cutting each tile's run out of the sorted keys; for zoomed-out
+    views the precomputed clusters of one level stand in for the points.
+    """
+
+    def __init__(self, df):
+        latitude = df['latitude'].to_numpy(dtype='float64', na_value=np.nan)
+        longitude = df['longitude'].to_numpy(dtype='float64', na_value=np.nan)
+        located = np.flatnonzero(~np.isnan(latitude) & ~np.isnan(longitude))
+        keys = tile_keys(latitude[located], longitude[located])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.positions = located[order]
+        self.latitude = latitude[self.positions]
+        self.longitude = longitude[self.positions]
+        price = df['price'].to_numpy(dtype='float64', na_value=np.nan)[self.positions]
+
+        self.clusters = {}
+        for zoom in CLUSTER_ZOOMS:
+            _, starts, counts = np.unique(self.keys >> np.uint64(2 * (MAX_ZOOM - zoom)), return_index=True,
+                                              return_counts=True)
+            priced = ~np.isnan(price)
+            with np.errstate(invalid='ignore'):
+                clusters = pd.DataFrame({
+                    'latitude': np.add.reduceat(self.latitude, starts) / counts,
+                    'longitude': np.add.reduceat(self.longitude, starts) / counts,
+                    'price': np.round(np.add.reduceat(np.where(priced, price, 0.0), starts)
+                                      / np.add.reduceat(priced.astype(np.int64), starts), 2),
+                    'count': counts,
+                })
+            clusters.attrs['cell_size'] = (180.0 / 2 ** zoom, 360.0 / 2 ** zoom)
+            self.clusters[zoom] = clusters
+
+    def _cover(self, south, west, north, east, max_tiles=16):
+        """Tiles of a single zoom level covering the box, at most about max_tiles of them"""
+        zoom = MAX_ZOOM
+        while zoom > 0:
+            tile_height, tile_width = 180.0 / 2 ** zoom, 360.0 / 2 ** zoom
+            rows = int((north + 90.0) // tile_height) - int((south + 90.0) // tile_height) + 1
+            columns = int((east + 180.0) // tile_width) - int((west + 180.0) // tile_width) + 1
+            if rows * columns <= max_tiles:
+                break
+            zoom -= 1
+        scale = 2 ** zoom
+        row_range = np.arange(int((south + 90.0) / 180.0 * scale),
+                              min(int((north + 90.0) / 180.0 * scale), scale - 1) + 1)
+        column_range = np.arange(int((west + 180.0) / 360.0 * scale),
+                                 min(int((east + 180.0) / 360.0 * scale), scale - 1) + 1)
+        rows, columns = np.meshgrid(row_range, column_range, indexing='ij')
+        tiles = _spread_bits(columns.ravel()) | (_spread_bits(rows.ravel()) << np.uint64(1))
+        shift = np.uint64(2 * (MAX_ZOOM - zoom))
+        return tiles << shift, (tiles + np.uint64(1)) << shift
+
+    def points_in(self, south, west, north, east):
+        """Row positions of the points inside the box"""
+        lows, highs = self._cover(south, west, north, east)
+        starts = np.searchsorted(self.keys, lows, side='left')
+        stops = np.searchsorted(self.keys, highs, side='left')
+        candidates = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)] or [[]])
+        candidates = candidates.astype(np.int64)
+        inside = ((self.latitude[candidates] >= south) & (self.latitude[candidates] <= north)
+                  & (self.longitude[candidates] >= west) & (self.longitude[candidates] <= east))
+        return np.sort(self.positions[candidates[inside]])
+
+    def clusters_in(self, south, west, north, east, zoom):
+        """Precomputed clusters inside the box, about 8x8 of them per map tile at this zoom"""
+        clusters = self.clusters[cluster_zoom(zoom)]
+        inside = (clusters['latitude'].between(south, north) & clusters['longitude'].between(west, east))
+        result = clusters[inside].reset_index(drop=True)
+        result.attrs = clusters.attrs
+        return result
@@ -0,0 +1,130 @@
+"""Materialized rollups of the airbnb table for the Advanced Analysis page.
+
+airbnb_rollup holds, per (country, property_type, room_type), how many
+listings have each price, review score, cancellation policy and availability
+value. That is everything the page's charts need, so when its price and
+review sliders are left at their full range the page reads rollup rows
+instead of the listings themselves. There is one row per distinct value,
+so a large market still has tens of thousands of them (about 49k for 250k
+listings), but they are a few narrow columns instead of whole listings.
+
+    python summaries.py
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from aggregations import AVAILABILITY_COLUMNS, PRICE_BINS, REVIEW_SCORE_BINS, bin_index
+from data_access import DATABASE_URL, get_engine, statement
+from queries import where_clause
+
+ROLLUP_MEASURES = ['price', 'review_scores_rating', 'cancellation_policy'] + AVAILABILITY_COLUMNS
+
+# Listings without a price or review count never pass the page's range sliders, so leave them out
+ROLLUP_SQL = "CREATE MATERIALIZED VIEW IF NOT EXISTS airbnb_rollup AS {};".format(" UNION ALL ".join(
+    f"SELECT country, property_type, room_type, '{measure}' AS measure, {measure}::text AS value, COUNT(*) AS n "
+    f"FROM airbnb WHERE price IS NOT NULL AND number_of_reviews IS NOT NULL "
+    f"GROUP BY country, property_type, room_type, {measure}"
+    for measure in ROLLUP_MEASURES))
+ROLLUP_INDEX_SQL = ("CREATE UNIQUE INDEX IF NOT EXISTS airbnb_rollup_idx "
+                    "ON airbnb_rollup (country, property_type, room_type, measure, value);")
+
+
+def build_summaries(cursor):
+    """Create the rollup if missing and bring it up to date with the airbnb table"""
+    cursor.execute("SELECT to_regclass('airbnb_rollup') IS NOT NULL;")
+    exists = cursor.fetchone()[0]
+    cursor.execute(ROLLUP_SQL)
+    cursor.execute(ROLLUP_INDEX_SQL)
+    if exists:
+        # Readers keep seeing the previous rollup until the refresh commits
+        cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY airbnb_rollup;")
+
+
+def read_rollup(engine, filters):
+    """Rollup rows for the country / property type / room type selections of a page"""
+    where, params = where_clause({column: value for column, value in filters.items()
+                                  if column in ('country', 'property_type', 'room_type')})
+    query = statement(f"SELECT property_type, room_type, measure, value, n FROM airbnb_rollup{where};")
+    with engine.connect() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def _value_counts(rollup, measure):
+    rows = rollup[rollup['measure'] == measure]
+    return rows[rows['value'].notna()]
+
+
+def _sorted_counts(counts, label, count_name):
+    counts = counts[counts > 0].sort_index()
+    return (counts.sort_values(ascending=False, kind='stable').rename_axis(label)
+            .reset_index(name=count_name))
+
+
+def summarize_rollup(rollup, price_bins=PRICE_BINS, review_score_bins=REVIEW_SCORE_BINS):
+    """Same summaries as aggregations.summarize, computed from rollup rows"""
+    price = _value_counts(rollup, 'price')
+    price_value = price['value'].astype('float64').to_numpy()
+    price_n = price['n'].to_numpy(dtype='float64')
+
+    room_type_counts = _sorted_counts(price.groupby('room_type')['n'].sum(), 'room_type', 'count')
+
+    weighted = price.assign(total=price_value * price_n)
+    sums = weighted.groupby(['property_type', 'room_type'])[['total', 'n']].sum()
+    price_matrix = (sums['total'] / sums['n']).unstack('room_type')
+
+    price_bin, price_edges = bin_index(price_value, price_bins)
+    price_histogram = (pd.DataFrame({'property_type': price['property_type'].to_numpy(), 'bin': price_bin,
+                                     'count': price_n.astype(np.int64)})
+                       .groupby(['property_type', 'bin'], sort=True)['count'].sum().reset_index())
+    price_histogram = pd.DataFrame({
+        'property_type': price_histogram['property_type'],
+        'price_start': price_edges[price_histogram['bin']],
+        'price_end': price_edges[price_histogram['bin'] + 1],
+        'count': price_histogram['count'],
+    })
+
+    scores = _value_counts(rollup, 'review_scores_rating')
+    review_bin, review_edges = bin_index(scores['value'].astype('float64').to_numpy(), review_score_bins)
+    review_score_histogram = pd.DataFrame({
+        'review_scores_start': review_edges[:-1],
+        'review_scores_end': review_edges[1:],
+        'count': np.bincount(review_bin, weights=scores['n'], minlength=review_score_bins).astype(np.int64),
+    })
+
+    cancellation = _value_counts(rollup, 'cancellation_policy')
+    cancellation_counts = _sorted_counts(cancellation.groupby('value')['n'].sum(), 'cancellation_policy',
+                                         'number_of_hotels')
+
+    availability = {}
+    for column in AVAILABILITY_COLUMNS:
+        days = _value_counts(rollup, column)
+        counts = days.groupby(days['value'].astype('int64'))['n'].sum()
+        availability[column] = counts.rename_axis(column).reset_index(name='number_of_hotels')
+
+    return {
+        'listing_count': int(price_n.sum()),
+        'room_type_counts': room_type_counts,
+        'price_matrix': price_matrix,
+        'price_histogram': price_histogram,
+        'review_score_histogram': review_score_histogram,
+        'cancellation_counts': cancellation_counts,
+        'availability': availability,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the airbnb summary rollups")
+    parser.add_argument('--url', default=DATABASE_URL)
+    args = parser.parse_args()
+    conn = get_engine(args.url).raw_connection()
+    try:
+        build_summaries(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
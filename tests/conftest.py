@@ -0,0 +1,98 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from listing_store import ListingStore  # noqa: E402
+from schema import compact_frame  # noqa: E402
+
+COUNTRIES = ['Australia', 'Brazil', 'Canada', 'Hong Kong', 'Portugal', 'Spain', 'Turkey', 'United States']
+PROPERTY_TYPES = ['Apartment', 'House', 'Condominium', 'Loft', 'Townhouse', 'Guest suite', 'Hostel', 'Villa',
+                  'Boutique hotel', 'Cottage', 'Bungalow', 'Cabin', 'Chalet', 'Boat']
+ROOM_TYPES = ['Entire home/apt', 'Private room', 'Shared room']
+CANCELLATION_POLICIES = ['flexible', 'moderate', 'strict_14_with_grace_period', 'super_strict_30']
+WORDS = ['Cozy', 'bright', 'beach', 'beachfront', 'loft', 'Loft-style', 'view', 'café', 'metro', 'garden',
+         'STUDIO', 'quiet', 'ocean', 'old_town', 'park']
+
+
+def raw_listings(rows, seed=0):
+    """Airbnb rows as read_sql returns them, with skewed countries and some missing values"""
+    rng = np.random.default_rng(seed)
+    country_weights = np.array([30, 20, 15, 10, 10, 8, 5, 2], dtype='float64')
+    # A few countries hold most listings, and the smallest only a handful
+    country = np.array(COUNTRIES, dtype=object)[rng.choice(len(COUNTRIES), rows,
+                                                           p=country_weights / country_weights.sum())]
+
+    def pick(values, missing=0.0):
+        picked = np.array(values, dtype=object)[rng.integers(0, len(values), rows)]
+        picked[rng.random(rows) < missing] = None
+        return picked
+
+    def text(words, missing=0.05):
+        texts = np.array([' '.join(rng.choice(WORDS, words)) + rng.choice(['', '!', ', and more'])
+                          for _ in range(rows)], dtype=object)
+        texts[rng.random(rows) < missing] = None
+        return texts
+
+    price = np.round(rng.lognormal(4.6, 0.8, rows), 2)
+    price[rng.random(rows) < 0.02] = np.nan
+    reviews = (rng.geometric(0.05, rows) - 1).astype('float64')
+    reviews[rng.random(rows) < 0.02] = np.nan
+    scores = np.clip(np.round(100 - rng.exponential(6, rows)), 20, 100)
+    scores[reviews == 0] = np.nan
+    latitude = rng.uniform(-60, 70, rows)
+    longitude = rng.uniform(-180, 180, rows)
+    unlocated = rng.random(rows) < 0.01
+    latitude[unlocated] = np.nan
+    return pd.DataFrame({
+        '_id': np.arange(1, rows + 1),
+        'name': text(3), 'summary': text(8), 'street': text(2), 'host_name': pick(['Ana', 'Bo', 'Chen', 'Dev']),
+        'property_type': pick(PROPERTY_TYPES, 0.01), 'room_type': pick(ROOM_TYPES, 0.01),
+        'cancellation_policy': pick(CANCELLATION_POLICIES),
+        'accommodates': rng.integers(1, 17, rows), 'bedrooms': rng.integers(0, 6, rows),
+        'beds': rng.integers(1, 9, rows), 'bathrooms': rng.choice([1.0, 1.5, 2.0, 3.0], rows),
+        'price': price, 'number_of_reviews': reviews, 'review_scores_rating': scores,
+        'availability_30': rng.integers(0, 31, rows), 'availability_60': rng.integers(0, 61, rows),
+        'availability_90': rng.integers(0, 91, rows), 'availability_365': rng.integers(0, 366, rows),
+        'latitude': latitude, 'longitude': longitude, 'country': country,
+        'last_scraped': pick(['2019-02-16', '2019-02-17', '2019-02-18']),
+    })
+
+
+def write_table(engine, raw):
+    """Replace the airbnb table with these rows"""
+    raw.to_sql('airbnb', engine, if_exists='replace', index=False)
+
+
+@pytest.fixture
+def make_raw():
+    return raw_listings
+
+
+@pytest.fixture
+def raw():
+    return raw_listings(3000)
+
+
+@pytest.fixture
+def listings(raw):
+    return compact_frame(raw)
+
+
+@pytest.fixture
+def engine(tmp_path, raw):
+    """SQLite database holding the airbnb table, standing in for Postgres"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'airbnb.db'}")
+    write_table(engine, raw)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def store(engine):
+    return ListingStore(engine, ttl=0)
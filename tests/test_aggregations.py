@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from aggregations import AVAILABILITY_COLUMNS, PRICE_BINS, REVIEW_SCORE_BINS, summarize
+from summaries import ROLLUP_MEASURES, summarize_rollup
+
+
+def country_rows(listings):
+    """Rows of the largest country, with every property type left in"""
+    country = listings['country'].value_counts().index[0]
+    return listings[listings['country'] == country]
+
+
+def rollup(df):
+    """What airbnb_rollup holds for these rows: listings per group and value of every measure, values as text"""
+    df = df[df['price'].notna() & df['number_of_reviews'].notna()]
+    parts = []
+    for measure in ROLLUP_MEASURES:
+        values = df[measure].astype(object).where(df[measure].notna(), None)
+        counts = (df[['property_type', 'room_type']].astype(object)
+                  .assign(value=values.map(lambda value: None if value is None else str(value)))
+                  .groupby(['property_type', 'room_type', 'value'], dropna=False).size())
+        parts.append(counts.reset_index(name='n').assign(measure=measure))
+    return pd.concat(parts, ignore_index=True)
+
+
+def counts(values):
+    """Listings per value, values that no listing has left out"""
+    return {key: count for key, count in values.value_counts().items() if count > 0}
+
+
+def test_counts_match_value_counts(listings):
+    df = country_rows(listings)
+    summary = summarize(df)
+    assert summary['listing_count'] == len(df)
+    room_types = summary['room_type_counts'].set_index('room_type')['count']
+    assert room_types.to_dict() == counts(df['room_type'])
+    assert room_types.is_monotonic_decreasing
+    policies = summary['cancellation_counts'].set_index('cancellation_policy')['number_of_hotels']
+    assert policies.to_dict() == counts(df['cancellation_policy'])
+    for column in AVAILABILITY_COLUMNS:
+        days = summary['availability'][column].set_index(column)['number_of_hotels']
+        assert days.index.is_monotonic_increasing
+        assert days.to_dict() == counts(df[column])
+
+
+def test_price_matrix_matches_pivot_table(listings):
+    df = country_rows(listings)
+    expected = df.pivot_table(index='property_type', columns='room_type', values='price', aggfunc='mean',
+                              observed=True)
+    actual = summarize(df)['price_matrix'].loc[expected.index, expected.columns]
+    np.testing.assert_allclose(actual.to_numpy(dtype='float64'), expected.to_numpy(dtype='float64'))
+
+
+def test_histograms_match_numpy(listings):
+    # More property types than fit in int8 once multiplied by the number of price bins
+    df = country_rows(listings)
+    assert df['property_type'].nunique() * PRICE_BINS > 127
+    summary = summarize(df)
+
+    prices = df['price'].to_numpy(dtype='float64', na_value=np.nan)
+    edges = np.linspace(np.nanmin(prices), np.nanmax(prices), PRICE_BINS + 1)
+    histogram = summary['price_histogram']
+    for property_type, rows in df.groupby('property_type', observed=True):
+        counts, _ = np.histogram(rows['price'].dropna().to_numpy(dtype='float64'), bins=edges)
+        cells = histogram[histogram['property_type'] == property_type]
+        expected = pd.Series(counts, index=edges[:-1])
+        np.testing.assert_array_equal(cells['count'].to_numpy(), expected[expected > 0].to_numpy())
+        np.testing.assert_allclose(cells['price_start'].to_numpy(), expected[expected > 0].index.to_numpy())
+
+    scores = df['review_scores_rating'].dropna().to_numpy(dtype='float64')
+    counts, edges = np.histogram(scores, bins=REVIEW_SCORE_BINS)
+    np.testing.assert_array_equal(summary['review_score_histogram']['count'].to_numpy(), counts)
+    np.testing.assert_allclose(summary['review_score_histogram']['review_scores_start'].to_numpy(), edges[:-1])
+
+
+def test_rollup_gives_the_same_summary(listings):
+    df = country_rows(listings)
+    df = df[df['price'].notna() & df['number_of_reviews'].notna()]
+    expected, actual = summarize(df), summarize_rollup(rollup(df))
+    assert actual['listing_count'] == expected['listing_count']
+    for name in ('room_type_counts', 'cancellation_counts'):
+        pd.testing.assert_frame_equal(actual[name].astype(str), expected[name].astype(str))
+    np.testing.assert_allclose(actual['price_matrix'].loc[expected['price_matrix'].index,
+                                                          expected['price_matrix'].columns].to_numpy(dtype='float64'),
+                               expected['price_matrix'].to_numpy(dtype='float64'))
+    order = ['property_type', 'price_start']
+    pd.testing.assert_frame_equal(
+        actual['price_histogram'].astype({'property_type': str}).sort_values(order).reset_index(drop=True),
+        expected['price_histogram'].astype({'property_type': str}).sort_values(order).reset_index(drop=True),
+        check_dtype=False)
+    pd.testing.assert_frame_equal(actual['review_score_histogram'], expected['review_score_histogram'],
+                                  check_dtype=False)
+    for column in AVAILABILITY_COLUMNS:
+        pd.testing.assert_frame_equal(actual['availability'][column], expected['availability'][column],
+                                      check_dtype=False)
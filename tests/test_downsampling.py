@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from downsampling import grid_aggregate, stratified_sample
+
+
+def strata(sizes):
+    """Frame with one property type per size, rows of each type spread through the frame"""
+    types = np.repeat([f'type {number}' for number in range(len(sizes))], sizes)
+    order = np.random.default_rng(5).permutation(len(types))
+    return pd.DataFrame({'property_type': types[order], 'price': np.arange(len(types), dtype='float64')})
+
+
+def test_small_frames_are_returned_whole(listings):
+    assert stratified_sample(listings, len(listings)) is listings
+
+
+def test_sample_is_a_deterministic_subset_in_frame_order(listings):
+    sample = stratified_sample(listings, 500)
+    assert len(sample) <= 500
+    assert sample.index.is_monotonic_increasing
+    assert sample.index.isin(listings.index).all()
+    pd.testing.assert_frame_equal(sample, stratified_sample(listings, 500))
+
+
+def test_groups_keep_their_share():
+    df = strata([6000, 3000, 1000])
+    counts = stratified_sample(df, 1000)['property_type'].value_counts()
+    assert len(counts) == 3 and counts.sum() <= 1000
+    for kind, share in {'type 0': 600, 'type 1': 300, 'type 2': 100}.items():
+        assert abs(counts[kind] - share) <= 1
+
+
+def test_many_small_strata_stay_within_the_budget():
+    # 300 types of 3 rows next to one large type: a row for every type would be 301 rows
+    df = strata([9000] + [3] * 300)
+    for budget in (10, 100, 250, 400):
+        sample = stratified_sample(df, budget)
+        assert len(sample) <= budget
+        assert sample['property_type'].nunique() == min(budget, 301)
+
+
+def test_rare_types_are_kept_while_the_budget_allows():
+    df = strata([9000, 50, 5, 1])
+    kinds = set(stratified_sample(df, 100)['property_type'])
+    assert kinds == {'type 0', 'type 1', 'type 2', 'type 3'}
+
+
+def test_grid_aggregate_counts_every_located_listing(listings):
+    cells = grid_aggregate(listings, 400)
+    assert len(cells) <= 400
+    assert cells['count'].sum() == listings[['latitude', 'longitude']].notna().all(axis=1).sum()
@@ -0,0 +1,124 @@
+import io
+import json
+
+import pytest
+
+from etl import COLUMNS, PriceOutliers, copy_rows, flatten_record, iter_records
+
+
+def listing(_id, **fields):
+    """One listing as the dump stores it, in MongoDB extended JSON"""
+    record = {
+        '_id': str(_id), 'name': f'Listing {_id}', 'room_type': 'Private room', 'property_type': 'House',
+        'last_scraped': {'$date': '2019-02-16T05:00:00.000Z'},
+        'calendar_last_scraped': {'$date': {'$numberLong': '1550293200000'}},
+        'accommodates': {'$numberInt': '2'}, 'bedrooms': None, 'beds': '2', 'number_of_reviews': 1.0,
+        'bathrooms': {'$numberDecimal': '1.5'}, 'price': {'$numberDecimal': '80.00'},
+        'amenities': ['Wifi', 'Kitchen'],
+        'host': {'host_id': '51399391', 'host_name': 'Ana', 'host_response_rate': '90',
+                 'host_thumbnail_url': 'https://example.com/thumb.jpg', 'host_verifications': ['email']},
+        'address': {'street': 'Porto, Porto, Portugal', 'market': 'Porto', 'country': 'Portugal',
+                    'country_code': 'PT',
+                    'location': {'type': 'Point', 'coordinates': [-8.61308, 41.1413], 'is_location_exact': False}},
+        'availability': {'availability_30': 28, 'availability_365': {'$numberInt': '239'}},
+        'review_scores': {'review_scores_rating': 100},
+    }
+    record.update(fields)
+    return record
+
+
+def write_dump(tmp_path, records, lines=False):
+    path = tmp_path / ('dump.jsonl' if lines else 'dump.json')
+    if lines:
+        path.write_text('\n'.join(json.dumps(record, ensure_ascii=False) for record in records), encoding='utf-8')
+    else:
+        path.write_text(json.dumps(records, ensure_ascii=False, indent=1), encoding='utf-8')
+    return path
+
+
+@pytest.mark.parametrize('lines', [False, True])
+def test_records_are_read_across_chunk_boundaries(tmp_path, lines):
+    records = [listing(_id, summary='Café near the river ' * _id) for _id in range(1, 30)]
+    path = write_dump(tmp_path, records, lines)
+    for chunk_size in (7, 64, 1 << 20):
+        assert list(iter_records(path, chunk_size=chunk_size)) == records
+
+
+def test_truncated_dump_raises(tmp_path):
+    path = tmp_path / 'dump.json'
+    path.write_text(json.dumps([listing(1), listing(2)])[:-40], encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_records(path, chunk_size=16))
+
+
+def test_flatten_record_cleans_like_the_notebook():
+    row = flatten_record(listing(10006546))
+    assert set(row) <= set(COLUMNS)
+    assert row['_id'] == '10006546' and row['name'] == 'Listing 10006546'
+    assert row['last_scraped'] == '2019-02-16' and row['calendar_last_scraped'] == '2019-02-16'
+    assert row['amenities'] == 'Wifi, Kitchen'
+    assert row['accommodates'] == 2 and row['beds'] == 2 and row['number_of_reviews'] == 1
+    # Missing bedrooms become 0 and bathrooms are truncated to int, as the notebook's fillna(0).astype(int)
+    assert row['bedrooms'] == 0 and row['bathrooms'] == 1
+    assert row['price'] == 80.0
+    assert row['host_name'] == 'Ana' and row['host_response_rate'] == 90
+    assert row['host_response_time'] == 'Not Specified'
+    assert 'host_thumbnail_url' not in row and 'host_verifications' not in row
+    assert row['country'] == 'Portugal' and row['suburb'] is None
+    assert (row['longitude'], row['latitude']) == (-8.61308, 41.1413)
+    assert row['location_type'] == 'Point' and row['location_is_location_exact'] is False
+    assert row['availability_30'] == 28 and row['availability_365'] == 239 and row['availability_60'] is None
+    assert row['review_scores_rating'] == 100 and row['review_scores_value'] == 0
+
+
+def test_flatten_record_without_nested_objects():
+    row = flatten_record({'_id': 7, 'price': 10})
+    assert row['_id'] == '7' and row['amenities'] == ''
+    assert row['country'] is None and row['latitude'] is None and row['availability_30'] is None
+
+
+def test_price_outliers_are_found_and_room_means_kept():
+    outliers = PriceOutliers()
+    rows = [flatten_record(record) for record in [
+        listing(1, price=100, room_type='private room'), listing(2, price=300, room_type='private room'),
+        listing(3, price=50, room_type='shared room'), listing(4, price=45000, room_type='private room'),
+        listing(5, price=12000, room_type='shared room'), listing(6, price=None, room_type='private room'),
+        listing(7, price=20, room_type='Entire home/apt')]]
+    for row in rows:
+        outliers.add(row)
+    assert outliers.private_room_ids == ['4'] and outliers.shared_room_ids == ['5']
+    assert outliers.mean('private room') == pytest.approx((100 + 300 + 45000) / 3)
+    assert outliers.mean('shared room') == pytest.approx((50 + 12000) / 2)
+
+
+def test_room_types_are_matched_as_stored():
+    # The notebook compares df1['room_type'] == 'private room', which the dump's 'Private room' never equals
+    outliers = PriceOutliers()
+    for record in [listing(1, price=100), listing(2, price=45000), listing(3, price=50, room_type='Shared room')]:
+        outliers.add(flatten_record(record))
+    assert outliers.private_room_ids == ['2']
+    assert outliers.mean('private room') is None and outliers.mean('shared room') is None
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.batches = []
+
+    def copy_expert(self, statement, buffer):
+        self.batches.append((statement, buffer.read()))
+
+
+def test_copy_rows_writes_escaped_batches():
+    cursor = RecordingCursor()
+    records = [listing(_id, summary='Tab\there\nand a \\ backslash') for _id in range(1, 6)]
+    seen = []
+    assert copy_rows(cursor, records, batch_size=2, on_row=seen.append) == 5
+    assert [batch.count('\n') for _, batch in cursor.batches] == [2, 2, 1]
+    assert all(statement == f"COPY airbnb ({', '.join(COLUMNS)}) FROM STDIN" for statement, _ in cursor.batches)
+    assert [row['_id'] for row in seen] == ['1', '2', '3', '4', '5']
+
+    line = io.StringIO(cursor.batches[0][1]).readline().rstrip('\n').split('\t')
+    assert len(line) == len(COLUMNS)
+    values = dict(zip(COLUMNS, line))
+    assert values['summary'] == 'Tab\\there\\nand a \\\\ backslash'
+    assert values['suburb'] == '\\N' and values['_id'] == '1'
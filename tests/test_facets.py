@@ -0,0 +1,50 @@
+import numpy as np
+
+from conftest import write_table
+from facets import FacetService
+
+
+def assert_same_range(actual, expected):
+    np.testing.assert_array_equal(np.array(actual, dtype='float64'), np.array(expected, dtype='float64'))
+
+
+def test_sidebar_cascade_matches_the_source(store):
+    facets = FacetService(store)
+    rng = np.random.default_rng(3)
+    assert facets.options('country', {}) == store.options('country', {})
+    for country in store.options('country', {}):
+        filters = {'country': country}
+        assert facets.options('property_type', filters) == store.options('property_type', filters)
+        for column in ('price', 'number_of_reviews'):
+            assert_same_range(facets.value_range(column, filters), store.value_range(column, filters))
+
+        property_types = store.options('property_type', filters)
+        for _ in range(5):
+            filters = {'country': country,
+                       'property_type': list(rng.choice(property_types, rng.integers(1, 4), replace=True))}
+            assert facets.options('room_type', filters) == store.options('room_type', filters)
+            filters['room_type'] = store.options('room_type', filters)[:rng.integers(1, 4)]
+            for column in ('price', 'number_of_reviews'):
+                assert_same_range(facets.value_range(column, filters), store.value_range(column, filters))
+
+
+def test_filters_outside_the_metadata_fall_back_to_the_source(store):
+    facets = FacetService(store)
+    country = store.options('country', {})[0]
+    filters = {'country': country, 'price': (50, 120)}
+    assert facets.options('property_type', filters) == store.options('property_type', filters)
+    assert_same_range(facets.value_range('number_of_reviews', filters),
+                      store.value_range('number_of_reviews', filters))
+
+
+def test_new_data_version_drops_the_metadata(store, engine, make_raw):
+    facets = FacetService(store)
+    country = store.options('country', {})[0]
+    before = facets.value_range('price', {'country': country})
+
+    raw = make_raw(500, seed=9)
+    raw['price'] = raw['price'] * 10
+    write_table(engine, raw)
+    after = facets.value_range('price', {'country': country})
+    assert_same_range(after, store.value_range('price', {'country': country}))
+    assert after != before
@@ -0,0 +1,41 @@
+from figure_cache import FigureCache, estimate_size, normalize_filters
+
+
+def test_repeat_keys_are_hits():
+    cache = FigureCache()
+    calls = []
+    compute = lambda: calls.append(1) or {'figure': 1}  # noqa: E731
+    assert cache.get_or_compute('a', compute) == {'figure': 1}
+    assert cache.get_or_compute('a', compute) == {'figure': 1}
+    cache.get_or_compute('b', compute)
+    assert len(calls) == 2
+    assert cache.stats() == {'entries': 2, 'bytes': 2 * estimate_size({'figure': 1}), 'hits': 1, 'misses': 2,
+                             'evictions': 0}
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    size = estimate_size(b'x' * 1000)
+    cache = FigureCache(max_bytes=3 * size)
+    for key in 'abc':
+        cache.get_or_compute(key, lambda: b'x' * 1000)
+    cache.get_or_compute('a', lambda: b'x' * 1000)
+    cache.get_or_compute('d', lambda: b'x' * 1000)
+    assert cache.stats() == {'entries': 3, 'bytes': 3 * size, 'hits': 1, 'misses': 4, 'evictions': 1}
+    # 'b' was the least recently used; 'a' was touched before 'd' came in
+    cache.get_or_compute('a', lambda: b'x' * 1000)
+    cache.get_or_compute('b', lambda: b'x' * 1000)
+    assert cache.stats() == {'entries': 3, 'bytes': 3 * size, 'hits': 2, 'misses': 5, 'evictions': 2}
+
+
+def test_values_larger_than_the_cache_are_not_kept():
+    cache = FigureCache(max_bytes=1000)
+    assert cache.get_or_compute('big', lambda: b'x' * 5000) == b'x' * 5000
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+
+def test_filters_normalize_regardless_of_order():
+    first = {'country': 'Spain', 'property_type': ['House', 'Apartment'], 'price': (10, 20)}
+    second = {'price': [10, 20], 'property_type': ('Apartment', 'House'), 'country': 'Spain'}
+    assert normalize_filters(first) == normalize_filters(second)
+    # Range bounds keep their order
+    assert normalize_filters({'price': (20, 10)}) != normalize_filters({'price': (10, 20)})
@@ -0,0 +1,47 @@
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from instrumentation import StepTimer
+
+
+@pytest.fixture(autouse=True)
+def stop_tracing():
+    # The timer starts tracemalloc, which would slow every later test down
+    yield
+    tracemalloc.stop()
+
+
+def test_steps_ending_out_of_order_keep_their_own_peak():
+    # Steps on different threads open and close in any order, not as a stack
+    timer = StepTimer(trace_memory=True)
+    first, second = timer.step('first'), timer.step('second')
+    first.__enter__()
+    block = np.ones(1 << 18)
+    del block
+    second.__enter__()
+    first.__exit__(None, None, None)
+    second.__exit__(None, None, None)
+    peaks = timer.frame().set_index('step')['peak_bytes']
+    assert peaks['first'] >= 8 * (1 << 18)
+    assert peaks['second'] < 8 * (1 << 18)
+
+
+def test_steps_on_several_threads_are_all_recorded():
+    timer = StepTimer(trace_memory=True)
+
+    def work(number):
+        with timer.step('outer', worker=number):
+            for _ in range(20):
+                with timer.step('inner', worker=number):
+                    np.ones(10_000).sum()
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, range(16)))
+    records = timer.frame()
+    assert records.groupby('step').size().to_dict() == {'inner': 16 * 20, 'outer': 16}
+    assert (records['seconds'] >= 0).all()
+    # Every step saw at least its own allocation
+    assert (records['peak_bytes'] >= 80_000).all()
@@ -0,0 +1,153 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pandas as pd
+
+from conftest import write_table
+from listing_store import ListingStore
+
+
+def counting_loads(store):
+    """Patch the store to count its full loads"""
+    return mock.patch.object(store, 'load', wraps=store.load)
+
+
+def test_frame_is_loaded_once_and_shared(engine, raw):
+    store = ListingStore(engine)
+    with counting_loads(store) as load:
+        first, second = store.frame, store.frame
+    assert load.call_count == 1
+    assert len(first) == len(raw)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_version_is_only_checked_once_per_ttl(engine, raw):
+    store = ListingStore(engine, ttl=300)
+    assert len(store.frame) == len(raw)
+    write_table(engine, raw.iloc[:100])
+    assert len(store.frame) == len(raw)
+    store.refresh(force=True)
+    assert len(store.frame) == 100
+
+
+def test_reload_when_row_count_or_last_scraped_moves(engine, raw):
+    store = ListingStore(engine, ttl=0)
+    with counting_loads(store) as load:
+        store.frame
+        store.frame
+        assert load.call_count == 1
+
+        write_table(engine, raw.iloc[:100])
+        assert len(store.frame) == 100
+        assert load.call_count == 2
+
+        rescraped = raw.iloc[:100].assign(last_scraped='2019-03-01')
+        write_table(engine, rescraped)
+        assert (store.frame['last_scraped'] == '2019-03-01').all()
+        assert load.call_count == 3
+
+
+def test_pages_cannot_write_into_the_shared_frame(engine):
+    store = ListingStore(engine)
+    df = store.frame
+    df.loc[:, 'price'] = -1.0
+    df['extra'] = 1
+    assert (store.frame['price'] != -1.0).any()
+    assert 'extra' not in store.frame.columns
+
+
+def test_building_an_index_does_not_block_readers(store):
+    started, read = threading.Event(), threading.Event()
+    builds = []
+
+    def build(df):
+        builds.append(len(df))
+        started.set()
+        # Pages must get past refresh() while the index is being built
+        assert read.wait(10)
+        return 'index'
+
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(store.derived_index, 'slow', build)
+        assert started.wait(10)
+        store.select({'country': 'Spain'}, ['_id'])
+        read.set()
+        assert future.result()[1] == 'index'
+    assert store.derived_index('slow', build)[1] == 'index'
+    assert len(builds) == 1
+
+
+def record_load(engine, mode, ids=()):
+    """Log a load in airbnb_versions and the ids it touched in airbnb_changes, as etl.load_listings does"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS airbnb_versions "
+                             "(version INTEGER PRIMARY KEY, mode TEXT, changed_rows INTEGER);")
+        conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS airbnb_changes (version INTEGER, _id INTEGER);")
+        version = conn.exec_driver_sql("INSERT INTO airbnb_versions (mode, changed_rows) VALUES (?, ?);",
+                                       (mode, len(ids))).lastrowid
+        for _id in ids:
+            conn.exec_driver_sql("INSERT INTO airbnb_changes VALUES (?, ?);", (version, int(_id)))
+
+
+def upsert(engine, raw, changed):
+    """Table after an incremental load of `changed`, logged under a new load version"""
+    raw = pd.concat([raw[~raw['_id'].isin(changed['_id'])], changed], ignore_index=True)
+    write_table(engine, raw)
+    record_load(engine, 'incremental', changed['_id'])
+    return raw
+
+
+def by_id(df):
+    return df.sort_values('_id').reset_index(drop=True)
+
+
+def test_incremental_loads_merge_only_the_changed_rows(engine, raw, make_raw):
+    record_load(engine, 'replace')
+    store = ListingStore(engine, ttl=0)
+    store.frame
+    changed = raw.iloc[:50].assign(price=999.0, room_type='Shared room', last_scraped='2019-03-01')
+    added = make_raw(20, seed=3).assign(_id=lambda df: df['_id'] + len(raw), country='Iceland')
+    raw = upsert(engine, raw, pd.concat([changed, added], ignore_index=True))
+
+    with counting_loads(store) as load, mock.patch.object(store, 'load_changes',
+                                                          wraps=store.load_changes) as load_changes:
+        merged = store.frame
+    assert load.call_count == 0 and load_changes.call_count == 1
+    assert len(merged) == len(raw)
+    pd.testing.assert_frame_equal(by_id(merged), by_id(ListingStore(engine).frame), check_dtype=False,
+                                  check_categorical=False)
+    # The memory report describes the merged frame, not the one first loaded
+    assert store.memory_report.loc['total', 'after_bytes'] == merged.memory_usage(index=False, deep=True).sum()
+    assert store.memory_report.loc['total', 'before_bytes'] > store.memory_report.loc['total', 'after_bytes']
+    # The partition index was rebuilt over the merged rows
+    assert 'Iceland' in store.options('country', {})
+    assert len(store.select({'country': 'Iceland'})) == 20
+    assert sorted(store.select({'price': (999.0, 999.0)})['_id']) == list(range(1, 51))
+
+
+def test_full_load_since_the_cached_version_reloads(engine, raw):
+    record_load(engine, 'replace')
+    store = ListingStore(engine, ttl=0)
+    store.frame
+    upsert(engine, raw, raw.iloc[:10].assign(last_scraped='2019-03-01'))
+    write_table(engine, raw.iloc[:100])
+    record_load(engine, 'replace')
+    with counting_loads(store) as load:
+        assert len(store.frame) == 100
+    assert load.call_count == 1
+
+
+def test_table_rewritten_without_a_new_load_version_reloads(engine, raw):
+    record_load(engine, 'replace')
+    store = ListingStore(engine, ttl=0)
+    store.frame
+    # As the notebook's DROP and to_sql append do: the table moves, airbnb_versions does not
+    rescraped = raw.iloc[:100].assign(price=5.0, last_scraped='2019-03-01')
+    write_table(engine, rescraped)
+    with counting_loads(store) as load, mock.patch.object(store, 'load_changes',
+                                                          wraps=store.load_changes) as load_changes:
+        df = store.frame
+    assert load.call_count == 1 and load_changes.call_count == 0
+    assert len(df) == 100 and (df['price'] == 5.0).all()
+    assert store.data_version()[2] == 1
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from partition_index import CountryPartitionIndex, partition_order
+
+
+def brute_force(df, filters):
+    mask = pd.Series(True, index=df.index)
+    for column, value in filters.items():
+        if column in ('price', 'number_of_reviews'):
+            low, high = value
+            mask &= df[column].between(low, high).fillna(False).astype(bool)
+        else:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            mask &= df[column].isin(values)
+    return np.flatnonzero(mask.to_numpy())
+
+
+def random_filters(rng, df):
+    filters = {}
+    if rng.random() < 0.8:
+        filters['country'] = rng.choice(df['country'].cat.categories.tolist() + ['Atlantis'])
+    if rng.random() < 0.6:
+        low, high = np.sort(rng.uniform(0, 400, 2))
+        filters['price'] = (low, high)
+    if rng.random() < 0.5:
+        types = df['property_type'].cat.categories.tolist()
+        filters['property_type'] = list(rng.choice(types, rng.integers(1, 4), replace=False))
+    if rng.random() < 0.5:
+        filters['room_type'] = rng.choice(df['room_type'].cat.categories.tolist() + ['Castle'])
+    if rng.random() < 0.4:
+        filters['number_of_reviews'] = (int(rng.integers(0, 10)), int(rng.integers(10, 60)))
+    return filters
+
+
+def test_partition_order_groups_countries_by_price(listings):
+    df = listings.take(partition_order(listings)).reset_index(drop=True)
+    codes = df['country'].cat.codes.to_numpy()
+    assert (np.diff(codes) >= 0).all()
+    for _, prices in df.groupby('country', observed=True)['price']:
+        prices = prices.dropna().to_numpy()
+        assert (np.diff(prices) >= 0).all()
+
+
+def test_positions_match_brute_force(listings):
+    df = listings.take(partition_order(listings)).reset_index(drop=True)
+    index = CountryPartitionIndex(df)
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        filters = random_filters(rng, df)
+        np.testing.assert_array_equal(np.sort(index.positions(filters)), brute_force(df, filters), str(filters))
+
+
+def test_every_country_has_its_slice(listings):
+    df = listings.take(partition_order(listings)).reset_index(drop=True)
+    index = CountryPartitionIndex(df)
+    assert sorted(index.slices) == sorted(df['country'].dropna().unique())
+    for country, (start, stop) in index.slices.items():
+        assert (df['country'].iloc[start:stop] == country).all()
+        assert stop - start == (df['country'] == country).sum()
+
+
+def test_store_select_matches_brute_force(store):
+    df = store.frame
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        filters = random_filters(rng, df)
+        selected = store.select(filters, ['_id'])
+        assert sorted(selected['_id']) == sorted(df['_id'].iloc[brute_force(df, filters)])
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from listing_store import ListingStore
+from schema import compact_frame, memory_report
+
+
+def test_columns_get_the_smallest_dtype_their_schema_allows(raw):
+    raw = raw.assign(
+        security_deposit=[Decimal('150.50') if position % 3 else None for position in range(len(raw))],
+        host_is_superhost=np.arange(len(raw)) % 2 == 0,
+        host_identity_verified=[None if position % 5 == 0 else True for position in range(len(raw))])
+    df = compact_frame(raw)
+    for column in ('country', 'property_type', 'room_type', 'cancellation_policy'):
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+        pd.testing.assert_series_equal(df[column].astype(object), raw[column], check_dtype=False)
+    assert df['price'].dtype == 'float64' and df['latitude'].dtype == 'float64'
+    assert df['bathrooms'].dtype == 'float32' and df['security_deposit'].dtype == 'float32'
+    assert df['security_deposit'].iloc[1] == np.float32(150.5) and np.isnan(df['security_deposit'].iloc[0])
+    assert df['availability_30'].dtype == 'int8' and df['availability_365'].dtype == 'int16'
+    # Missing review counts keep a nullable int instead of becoming float
+    assert df['number_of_reviews'].dtype == 'Int16'
+    assert df['number_of_reviews'].isna().sum() == raw['number_of_reviews'].isna().sum()
+    assert df['host_is_superhost'].dtype == bool and df['host_identity_verified'].dtype == 'boolean'
+    assert df['last_scraped'].dtype.kind == 'M'
+    np.testing.assert_array_equal(df['price'].to_numpy(), raw['price'].to_numpy())
+
+
+def test_memory_report_compares_every_column(raw):
+    df = compact_frame(raw)
+    report = memory_report(raw, df)
+    assert set(report.index) == set(raw.columns) | {'total'}
+    assert report.loc['total', 'before_bytes'] == raw.memory_usage(index=False, deep=True).sum()
+    assert report.loc['total', 'after_bytes'] == df.memory_usage(index=False, deep=True).sum()
+    assert report.loc['country', 'ratio'] > 4
+    np.testing.assert_allclose(report['ratio'], report['before_bytes'] / report['after_bytes'])
+    assert report['before_bytes'].is_monotonic_decreasing
+
+
+def test_store_keeps_the_compact_frame(engine):
+    store = ListingStore(engine)
+    assert isinstance(store.frame['country'].dtype, pd.CategoricalDtype)
+    report = store.memory_report
+    assert set(report.index) == set(store.frame.columns) | {'total'}
+    assert report.loc['total', 'after_bytes'] < report.loc['total', 'before_bytes']
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from search_index import SEARCH_COLUMNS, InvertedIndex, tokenize
+
+
+def brute_force(df, query):
+    terms = tokenize(query)
+    columns = [column for column in SEARCH_COLUMNS if column in df.columns]
+    matches = []
+    for position, row in enumerate(df[columns].itertuples(index=False)):
+        tokens = {token for value in row if not pd.isna(value) for token in tokenize(str(value))}
+        if all(any(token.startswith(term) for token in tokens) for term in terms):
+            matches.append(position)
+    return np.array(matches, dtype=np.int64)
+
+
+def test_search_matches_every_term_by_prefix(listings):
+    index = InvertedIndex(listings)
+    for query in ['beach', 'BEACH', 'Beachf', 'loft view', 'loft-style', 'caf', 'café', 'old_town', 'studio metro',
+                  'private room', 'hong', 'ana garden']:
+        np.testing.assert_array_equal(np.sort(index.search(query)), brute_force(listings, query), query)
+
+
+def test_search_without_matches_or_terms(listings):
+    index = InvertedIndex(listings)
+    assert len(index.search('zzz')) == 0
+    assert len(index.search('beach zzz')) == 0
+    assert len(index.search('  !? ')) == 0
+    assert len(InvertedIndex(listings.iloc[:0]).search('beach')) == 0
+
+
+def test_search_ranks_best_matches_first_and_limits(listings):
+    index = InvertedIndex(listings)
+    results = index.search('beach')
+    np.testing.assert_array_equal(index.search('beach', limit=10), results[:10])
+    # A listing mentioning the term twice outranks one mentioning it once
+    df = pd.DataFrame({'name': ['beach house', 'beach beach house', 'house'], 'summary': [None, None, 'beach']})
+    assert list(InvertedIndex(df).search('beach')) == [1, 0, 2]
+
+
+def test_positions_do_not_depend_on_the_frame_index(listings):
+    relabelled = listings.set_index(listings.index[::-1] * 7)
+    for query in ['beach', 'café view']:
+        np.testing.assert_array_equal(InvertedIndex(relabelled).search(query), InvertedIndex(listings).search(query))
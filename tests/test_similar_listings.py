@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from conftest import write_table
+from similar_listings import DETAIL_COLUMNS, SimilarityIndex, SimilarListings
+
+
+def country_rows(listings):
+    country = listings['country'].value_counts().index[0]
+    return listings.loc[listings['country'] == country, DETAIL_COLUMNS]
+
+
+def test_neighbors_match_brute_force(listings):
+    index = SimilarityIndex(country_rows(listings))
+    matrix = index.matrix.astype('float64')
+    for position in np.random.default_rng(7).choice(len(matrix), 25, replace=False):
+        listing_id = index.frame['_id'].iloc[position]
+        distances = np.sqrt(((matrix - matrix[position]) ** 2).sum(axis=1))
+        distances[position] = np.inf
+        neighbors = index.neighbors(listing_id, k=8)
+        assert listing_id not in set(neighbors['_id'])
+        assert neighbors['distance'].is_monotonic_increasing
+        np.testing.assert_allclose(neighbors['distance'], np.sort(distances)[:8], rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(distances[index.ids.get_indexer(neighbors['_id'])], neighbors['distance'],
+                                   rtol=1e-4, atol=1e-4)
+
+
+def test_features_are_standardized(listings):
+    df = country_rows(listings)
+    listing_id = df['_id'].iloc[0]
+    expected = SimilarityIndex(df).neighbors(listing_id)
+    # A change of units does not change who is similar
+    rescaled = df.assign(latitude=df['latitude'] * 1000, accommodates=df['accommodates'] * 3)
+    assert SimilarityIndex(rescaled).neighbors(listing_id)['_id'].tolist() == expected['_id'].tolist()
+
+
+def test_identical_listing_is_nearest(listings):
+    df = country_rows(listings)
+    twin = df.iloc[[10]].assign(_id=-1)
+    neighbors = SimilarityIndex(pd.concat([df, twin])).neighbors(-1, k=1)
+    assert neighbors['_id'].tolist() == [df['_id'].iloc[10]]
+    assert neighbors['distance'].iloc[0] == 0
+
+
+def test_unknown_listings_and_tiny_countries(listings):
+    df = country_rows(listings)
+    assert SimilarityIndex(df).neighbors(-5).empty
+    assert SimilarityIndex(df.iloc[:1]).neighbors(df['_id'].iloc[0]).empty
+    assert len(SimilarityIndex(df.iloc[:3]).neighbors(df['_id'].iloc[0], k=10)) == 2
+
+
+def test_indexes_are_per_country_and_dropped_on_reload(store, engine, make_raw):
+    similar = SimilarListings(store)
+    country = store.options('country', {})[0]
+    listing_id = store.rows(['_id'], {'country': country})['_id'].iloc[0]
+    index = similar.index(country)
+    assert similar.index(country) is index
+    assert set(similar.similar(country, listing_id)['_id']) <= set(store.rows(['_id'], {'country': country})['_id'])
+
+    write_table(engine, make_raw(500, seed=9))
+    assert similar.index(country) is not index
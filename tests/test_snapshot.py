@@ -0,0 +1,104 @@
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import write_table
+from listing_store import ListingStore
+from schema import COLUMN_TYPES
+from search_index import InvertedIndex
+from snapshot import SnapshotSource, export_snapshot
+from spatial_index import viewport
+from test_partition_index import random_filters
+
+COLUMNS = ['_id', 'name', 'property_type', 'room_type', 'price', 'number_of_reviews', 'latitude']
+
+
+def full_columns(raw):
+    """Every column of the schema, as the export reads them; the ones raw_listings leaves out are NULL"""
+    return raw.assign(calendar_last_scraped=raw['last_scraped']).reindex(columns=list(COLUMN_TYPES))
+
+
+@pytest.fixture
+def full_table(engine, raw):
+    write_table(engine, full_columns(raw))
+    return engine
+
+
+@pytest.fixture
+def snapshot(tmp_path, full_table):
+    path = str(tmp_path / 'snapshot')
+    export_snapshot(full_table, path)
+    return SnapshotSource(path, ttl=0)
+
+
+def by_id(df):
+    return df.sort_values('_id').reset_index(drop=True)
+
+
+def assert_same_rows(actual, expected):
+    pd.testing.assert_frame_equal(by_id(actual), by_id(expected), check_dtype=False, check_categorical=False,
+                                  check_index_type=False)
+
+
+def bounds(value_range):
+    return np.array([np.nan if pd.isna(value) else float(value) for value in value_range])
+
+
+def test_filters_match_the_memory_store(snapshot, full_table):
+    store = ListingStore(full_table)
+    rng = np.random.default_rng(6)
+    for _ in range(60):
+        filters = random_filters(rng, store.frame)
+        assert_same_rows(snapshot.rows(COLUMNS, filters), store.rows(COLUMNS, filters))
+        for column in ('property_type', 'room_type'):
+            assert snapshot.options(column, filters) == store.options(column, filters)
+        for column in ('price', 'number_of_reviews'):
+            np.testing.assert_array_equal(bounds(snapshot.value_range(column, filters)),
+                                          bounds(store.value_range(column, filters)))
+    assert snapshot.options('country', {}) == store.options('country', {})
+
+
+def test_filtered_categories_only_hold_what_is_left(snapshot):
+    df = snapshot.rows(['property_type', 'room_type'], {'room_type': 'Shared room'})
+    assert list(df['room_type'].cat.categories) == ['Shared room']
+    assert list(df['property_type'].cat.categories) == sorted(df['property_type'].dropna().unique())
+
+
+def test_search_and_map_match_the_memory_store(snapshot, full_table):
+    store = ListingStore(full_table)
+    for query in ['beach', 'café view', 'zzz']:
+        assert sorted(snapshot.search(query)['_id']) == sorted(store.search(query)['_id'])
+    for bbox, zoom, budget in [(viewport(10.0, 20.0, 5), 5, 5000), ((-90.0, -180.0, 90.0, 180.0), 2, 100)]:
+        actual, expected = snapshot.map_view(bbox, zoom, budget), store.map_view(bbox, zoom, budget)
+        order = list(expected.columns)
+        pd.testing.assert_frame_equal(actual.sort_values(order).reset_index(drop=True),
+                                      expected.sort_values(order).reset_index(drop=True), check_dtype=False)
+
+
+def test_new_export_replaces_the_mapped_partitions(snapshot, full_table, raw):
+    before = snapshot.data_version()
+    assert len(snapshot.rows(['_id'], {})) == len(raw)
+    write_table(full_table, full_columns(raw.iloc[:100]))
+    # Exports are named by the second they start in
+    with mock.patch('snapshot.time', **{'strftime.return_value': 'next'}):
+        export_snapshot(full_table, snapshot.path)
+    assert snapshot.data_version() != before
+    assert sorted(snapshot.rows(['_id'], {})['_id']) == sorted(raw['_id'].iloc[:100])
+
+
+def test_search_reads_its_matches_from_the_indexed_export(snapshot, full_table, raw):
+    expected = sorted(ListingStore(full_table).search('beach')['_id'])
+    write_table(full_table, full_columns(raw.iloc[::-1].iloc[:100]))
+
+    def build_during_export(df):
+        index = InvertedIndex(df)
+        with mock.patch('snapshot.time', **{'strftime.return_value': 'next'}):
+            export_snapshot(full_table, snapshot.path)
+        return index
+
+    with mock.patch('snapshot.InvertedIndex', side_effect=build_during_export):
+        assert sorted(snapshot.search('beach')['_id']) == expected
+    # The next search sees the new export
+    assert sorted(snapshot.search('beach')['_id']) == sorted(ListingStore(full_table).search('beach')['_id'])
@@ -0,0 +1,40 @@
+import numpy as np
+
+from spatial_index import CLUSTER_ZOOMS, TileIndex, cluster_zoom, viewport
+
+
+def brute_force(df, south, west, north, east):
+    inside = (df['latitude'].between(south, north) & df['longitude'].between(west, east))
+    return np.flatnonzero(inside.to_numpy())
+
+
+def test_points_in_matches_brute_force(listings):
+    index = TileIndex(listings)
+    rng = np.random.default_rng(4)
+    boxes = [(-90.0, -180.0, 90.0, 180.0), (0.0, 0.0, 0.0, 0.0), (-10.0, 170.0, 10.0, 180.0)]
+    for _ in range(200):
+        latitude, longitude = rng.uniform(-80, 80), rng.uniform(-175, 175)
+        boxes.append(viewport(latitude, longitude, int(rng.integers(1, 17))))
+    for box in boxes:
+        np.testing.assert_array_equal(index.points_in(*box), brute_force(listings, *box), str(box))
+
+
+def test_clusters_cover_every_located_listing(listings):
+    index = TileIndex(listings)
+    located = listings[['latitude', 'longitude']].notna().all(axis=1).sum()
+    for zoom in CLUSTER_ZOOMS:
+        clusters = index.clusters[zoom]
+        assert clusters['count'].sum() == located
+        tile_height, tile_width = clusters.attrs['cell_size']
+        assert tile_height == 180.0 / 2 ** zoom and tile_width == 360.0 / 2 ** zoom
+
+
+def test_clusters_in_keeps_clusters_inside_the_box(listings):
+    index = TileIndex(listings)
+    box = viewport(20.0, 0.0, 3)
+    south, west, north, east = box
+    clusters = index.clusters_in(*box, 3)
+    assert clusters['latitude'].between(south, north).all()
+    assert clusters['longitude'].between(west, east).all()
+    everything = index.clusters_in(-90.0, -180.0, 90.0, 180.0, 3)
+    assert len(everything) == len(index.clusters[cluster_zoom(3)])